@@ -9,6 +9,10 @@ from typing import Union
 
 from .generic.schema import Schema, SchemaFileLoader, SchemaDefinedTypeLoader
 from .generic.db import GenericDB, DBDict, DBList, DBSplittedFilesLoader
+from .generic.snapshot import DBSnapshot
+from .generic.validator import DBValidator, DBValidationCache
+from .occupancy import racks_occupancy
+from .tags import RacksDBTagsIndex
 from . import bases
 
 
@@ -17,6 +21,7 @@ class RacksDB(GenericDB):
     DEFAULT_DB = "/var/lib/racksdb"
     DEFAULT_SCHEMA = "/usr/share/racksdb/schema.yml"
     DEFAULT_EXT = "/etc/racksdb/extensions.yml"
+    DEFAULT_CACHE = "~/.cache/racksdb"
     PREFIX = "RacksDB"
     DEFINED_TYPES_MODULE = "racksdb.dtypes"
 
@@ -26,6 +31,11 @@ class RacksDB(GenericDB):
 
     @property
     def nodes(self):
+        """Read-only dictionnary of the nodes of all infrastructures, cached until
+        the database is reloaded."""
+        return self.collection(self, "nodes", self._nodes)
+
+    def _nodes(self):
         result = DBDict()
         for infrastructure in self.infrastructures:
             result.update(infrastructure.nodes)
@@ -33,6 +43,11 @@ class RacksDB(GenericDB):
 
     @property
     def racks(self):
+        """Read-only list of the racks of all datacenters, cached until the database
+        is reloaded."""
+        return self.collection(self, "racks", self._racks)
+
+    def _racks(self):
         result = DBList()
         for datacenter in self.datacenters:
             for room in datacenter.rooms:
@@ -41,12 +56,53 @@ class RacksDB(GenericDB):
                         result.append(rack)
         return result
 
+    def racks_occupancy(self):
+        """Return the read-only dictionnary of racks names to their occupancy with
+        their fill rates, used and free slots and numbers of equipments, computed
+        for all racks in one pass and cached until the database is reloaded."""
+        return self.collection(self, "racks_occupancy", self._racks_occupancy)
+
+    def _racks_occupancy(self):
+        return racks_occupancy(self.racks, self._parts_by_racks())
+
+    def tags_index(self):
+        """Return the inverted index of tags to the datacenters, infrastructures and
+        nodes labelled with these tags, built on first access and cached until the
+        database is reloaded."""
+        return self.cached(self, "tags_index", lambda: RacksDBTagsIndex(self))
+
+    def _parts_by_racks(self):
+        """Return the read-only dictionnary of racks names to the list of
+        infrastructures layout parts in these racks, cached until the database is
+        reloaded."""
+        return self.collection(self, "racks_parts", self._racks_parts)
+
+    def _racks_parts(self):
+        result = DBDict()
+        for infrastructure in self.infrastructures:
+            for part in infrastructure.layout:
+                result.setdefault(part.rack.name, DBList()).append(part)
+        return result
+
+    def reload(self):
+        """Parse again the database files modified since last load and rebuild the
+        affected top-level collections. Return the set of names of rebuilt
+        collections. The schema and its extensions are not reloaded. In case of
+        error, the database and its loader are restored in their previous state,
+        so that all the modified files are considered again on next reload."""
+        state = self._loader.state()
+        try:
+            return super().reload(self._loader, self._loader.refresh())
+        except BaseException:
+            self._loader.restore(state)
+            raise
+
     @classmethod
-    def load(
+    def _paths(
         cls,
-        schema: Union[str, Path, None] = None,
-        ext: Union[str, Path, None] = None,
-        db: Union[str, Path, None] = None,
+        schema: Union[str, Path, None],
+        ext: Union[str, Path, None],
+        db: Union[str, Path, None],
     ):
         # Unfortunately, default values to arguments cannot be used as they are
         # class attributes and the class is not defined yet at this stage at
@@ -65,10 +121,67 @@ class RacksDB(GenericDB):
             db = Path(cls.DEFAULT_DB)
         elif isinstance(db, str):
             db = Path(db)
-        _schema = Schema(
+        return schema, ext, db
+
+    @classmethod
+    def _load_schema(cls, schema: Path, ext: Path):
+        return Schema(
             SchemaFileLoader(schema, ext),
             SchemaDefinedTypeLoader(cls.DEFINED_TYPES_MODULE),
         )
-        _db = cls(_schema, DBSplittedFilesLoader(db))
-        super(cls, _db).load(_db._loader)
+
+    @classmethod
+    def load(
+        cls,
+        schema: Union[str, Path, None] = None,
+        ext: Union[str, Path, None] = None,
+        db: Union[str, Path, None] = None,
+        cache: Union[str, Path, None] = None,
+        workers: int = 1,
+        lazy: bool = False,
+        expanded_cache: int = 0,
+    ):
+        schema, ext, db = cls._paths(schema, ext, db)
+        # When cache directory is provided, try to restore the DB from snapshot
+        # to avoid parsing schema and database files.
+        snapshot = None
+        if cache is not None:
+            snapshot = DBSnapshot(Path(cache).expanduser(), [schema, ext, db])
+            _db = snapshot.load(cls)
+            if _db is not None:
+                _db.cache_expanded(expanded_cache)
+                return _db
+        _schema = cls._load_schema(schema, ext)
+        _db = cls(_schema, DBSplittedFilesLoader(db, workers, lazy))
+        super(cls, _db).load(_db._loader, lazy)
+        # In lazy mode, the database is not entirely loaded at this stage, the
+        # snapshot is not saved.
+        if snapshot is not None and not lazy:
+            snapshot.save(_db)
+        _db.cache_expanded(expanded_cache)
         return _db
+
+    @classmethod
+    def validate(
+        cls,
+        schema: Union[str, Path, None] = None,
+        ext: Union[str, Path, None] = None,
+        db: Union[str, Path, None] = None,
+        cache: Union[str, Path, None] = None,
+        workers: int = 1,
+    ):
+        """Validate the database against the schema without loading the database
+        objects. Return the list of all errors found in database, the list is empty
+        when the database is valid. When cache directory is provided, the results
+        are recorded per database file so that only the modified files and the files
+        referencing their objects are checked again on next validation."""
+        schema, ext, db = cls._paths(schema, ext, db)
+        validator = DBValidator(cls._load_schema(schema, ext))
+        # The files are parsed lazily so that parsing errors are reported for every
+        # top-level keys, or for every files with validation cache.
+        loader = DBSplittedFilesLoader(db, workers, lazy=True)
+        if cache is None:
+            return validator.validate(loader)
+        return validator.validate(
+            loader, DBValidationCache(Path(cache).expanduser(), db, [schema, ext])
+        )
@@ -4,25 +4,47 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from .generic.db import DBList, DBDict
+import functools
+
+from ClusterShell.NodeSet import NodeSet, NodeSetParseError
+
+from .generic.db import DBList, DBDict, DBExpandableObject, DBObjectRange
+from .errors import RacksDBError
+
+
+@functools.lru_cache(maxsize=128)
+def _nodeset(expression):
+    """Return the NodeSet of the given nodeset expression, memoized as the same
+    expression is matched with all filtered objects."""
+    try:
+        return NodeSet(expression)
+    except NodeSetParseError as err:
+        raise RacksDBError(f"Invalid nodeset {expression}: {err}")
 
 
 class RacksDBDatacenterBase:
+    __slots__ = ()
+
     def _filter(self, name=None, tags=None):
         # filter by name
         if name is not None and name != self.name:
             return False
-        # filter by tags
-        if tags is not None:
-            for tag in tags:
-                if tag not in self.tags:
-                    return False
+        # filter by tags expression with the inverted index of tags
+        if tags is not None and not self._db.tags_index().match(self, tags):
+            return False
         return True
 
 
 class RacksDBInfrastructureBase:
+    __slots__ = ()
+
     @property
     def nodes(self):
+        """Read-only dictionnary of the nodes of the infrastructure, cached until the
+        database is reloaded."""
+        return self._db.collection(self, "nodes", self._nodes)
+
+    def _nodes(self):
         result = DBDict()
         for part in self.layout:
             # Iterate over the keys of DBDict instead of the DBDict itself to
@@ -35,15 +57,15 @@ class RacksDBInfrastructureBase:
         # filter by name
         if name is not None and name != self.name:
             return False
-        # filter by tags
-        if tags is not None:
-            for tag in tags:
-                if tag not in self.tags:
-                    return False
+        # filter by tags expression with the inverted index of tags
+        if tags is not None and not self._db.tags_index().match(self, tags):
+            return False
         return True
 
 
 class RacksDBNodeBase:
+    __slots__ = ()
+
     @property
     def tags(self):
         result = DBList()
@@ -56,21 +78,37 @@ class RacksDBNodeBase:
         return result
 
     def _filter(self, infrastructure=None, name=None, tags=None):
-        # filter by name
-        if name is not None and name != self.name:
-            return False
+        # filter by name with nodeset expression, expandable objects match when
+        # any of their names is in the nodeset.
+        if name is not None:
+            if isinstance(self.name, DBObjectRange):
+                if not self.name.rangeset & _nodeset(name):
+                    return False
+            elif self.name not in _nodeset(name):
+                return False
         # filter by infrastructure name
         if infrastructure is not None and infrastructure != self.infrastructure.name:
             return False
-        # filter by tags
-        if tags is not None:
-            for tag in tags:
-                if tag not in self.tags:
-                    return False
+        # filter by tags expression with the inverted index of tags
+        if tags is not None and not self._db.tags_index().match(self, tags):
+            return False
         return True
 
+    def _select(self, infrastructure=None, name=None, tags=None):
+        if not self._filter(infrastructure=infrastructure, tags=tags):
+            return
+        if name is None:
+            yield self
+        elif isinstance(self, DBExpandableObject):
+            # Expandable objects are restricted to the names in the nodeset, to
+            # keep their ranges folded.
+            yield from self.subsets(_nodeset(name))
+        elif self._filter(name=name):
+            yield self
+
 
 class RacksDBRackBase:
+    __slots__ = ()
 
     COMPUTED_PROPERTIES = ["nodes", "fillrate"]
 
@@ -80,34 +118,31 @@ class RacksDBRackBase:
             return False
         return True
 
+    def _parts(self):
+        """Return the list of infrastructures layout parts in the rack."""
+        return self._db._parts_by_racks().get(self.name, [])
+
     @property
     def fillrate(self):
         """Return the fill rate of the rack as a float normalized between 0 and 1."""
-        occupied = 0.0
-        for infrastructure in self._db.infrastructures:
-            for part in infrastructure.layout:
-                if self.name == part.rack.name:
-                    for equipment in part.nodes:
-                        occupied += equipment.type.height * equipment.type.width
-                    for equipment in part.storage:
-                        occupied += equipment.type.height * equipment.type.width
-                    for equipment in part.network:
-                        occupied += equipment.type.height * equipment.type.width
-        return occupied / self.type.slots
+        # The occupancy of all racks is computed at once on first access.
+        occupancy = self._db.racks_occupancy().get(self.name)
+        if occupancy is None:
+            return 0.0
+        return occupancy.fillrate
 
     @property
     def nodes(self):
         result = DBList()
         # add reference to infrastructures nodes
-        for infrastructure in self._db.infrastructures:
-            for part in infrastructure.layout:
-                if self.name == part.rack.name:
-                    for nodes in part.nodes.values():
-                        result.append(nodes)
+        for part in self._parts():
+            for nodes in part.nodes.values():
+                result.append(nodes)
         return result
 
 
 class RacksDBRacksRowBase:
+    __slots__ = ()
 
     COMPUTED_PROPERTIES = ["nbracks"]
 
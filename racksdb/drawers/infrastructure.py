@@ -39,6 +39,8 @@ class InfrastructureDrawer(Drawer):
         self.rack_rows = []
         # List of racks used by the insfrastructure
         self.racks = []
+        # Maximum height of racks in rack rows, indexed by rack rows names
+        self.rack_rows_heights = {}
 
     def _rack_row_dl(self, row) -> ImagePoint:
         # sum height of all previous rows
@@ -47,12 +49,12 @@ class InfrastructureDrawer(Drawer):
             if _row is row:
                 break
             pos_y += (
-                int(_row.height * self.SCALE)
+                int(self.rack_rows_heights[_row.name] * self.SCALE)
                 + self.ROW_LABEL_OFFSET
                 + self.RACK_LABEL_OFFSET
                 + self.RACK_OFFSET
             )
-        pos_y += int(row.height * self.SCALE)
+        pos_y += int(self.rack_rows_heights[row.name] * self.SCALE)
         return ImagePoint(self.MARGIN_LEFT, pos_y)
 
     def _rack_dl(self, row, rack) -> ImagePoint:
@@ -202,7 +204,9 @@ class InfrastructureDrawer(Drawer):
             "Sans", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD
         )
         self.ctx.set_font_size(14)
-        self.ctx.move_to(dl.x, dl.y - int(row.height * self.SCALE))
+        self.ctx.move_to(
+            dl.x, dl.y - int(self.rack_rows_heights[row.name] * self.SCALE)
+        )
         self.ctx.show_text(f"row {row.name}")
 
         # iterate over the racks to draw racks in row
@@ -230,8 +234,7 @@ class InfrastructureDrawer(Drawer):
             for rack in rack_row.racks:
                 row_max_height = max(row_max_height, rack.type.height)
             total_row_max_heights += row_max_height
-            # add attributes to row
-            rack_row.height = row_max_height
+            self.rack_rows_heights[rack_row.name] = row_max_height
 
         # Find the maximum rack x to calculate image width
         total_racks_widths = 0
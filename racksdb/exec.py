@@ -66,6 +66,33 @@ class RacksDBExec:
             default=RacksDB.DEFAULT_DB,
             type=Path,
         )
+        parser.add_argument(
+            "-c",
+            "--cache",
+            help="Directory of database snapshots cache, disabled when not set "
+            f"(ex: {RacksDB.DEFAULT_CACHE})",
+            type=Path,
+        )
+        parser.add_argument(
+            "-w",
+            "--workers",
+            help="Number of workers to parse database files in parallel "
+            "(default: %(default)s)",
+            default=1,
+            type=int,
+        )
+        parser.add_argument(
+            "--lazy",
+            action="store_true",
+            help="Load database collections on first access",
+        )
+        parser.add_argument(
+            "--expanded-cache",
+            help="Maximum number of memoized expanded objects, 0 to disable "
+            "(default: %(default)s)",
+            default=0,
+            type=int,
+        )
 
         # Unfortunately, Python 3.6 does support add_subparsers() required
         # attribute. The requirement is later handled with hasattr() check on
@@ -91,6 +118,12 @@ class RacksDBExec:
         parser_dump = subparsers.add_parser("dump", help="Dump raw loaded DB")
         parser_dump.set_defaults(func=self._run_dump)
 
+        # Parser for the validate command, the DB is validated without being loaded.
+        parser_validate = subparsers.add_parser(
+            "validate", help="Validate DB against schema and report all errors"
+        )
+        parser_validate.set_defaults(func=self._run_validate, load_db=False)
+
         self.views = RacksDBViews()
 
         # Generate subcommands for all declared views (converted to actions) and
@@ -124,14 +157,23 @@ class RacksDBExec:
 
         self._setup_logger()
 
-        try:
-            self.db = RacksDB.load(self.args.schema, self.args.ext, self.args.db)
-        except DBSchemaError as err:
-            logger.error("Error while loading schema: %s", err)
-            sys.exit(1)
-        except DBFormatError as err:
-            logger.error("Error while loading db: %s", err)
-            sys.exit(1)
+        if getattr(self.args, "load_db", True):
+            try:
+                self.db = RacksDB.load(
+                    self.args.schema,
+                    self.args.ext,
+                    self.args.db,
+                    self.args.cache,
+                    self.args.workers,
+                    self.args.lazy,
+                    self.args.expanded_cache,
+                )
+            except DBSchemaError as err:
+                logger.error("Error while loading schema: %s", err)
+                sys.exit(1)
+            except DBFormatError as err:
+                logger.error("Error while loading db: %s", err)
+                sys.exit(1)
 
         if not hasattr(self.args, "func"):
             parser.print_usage()
@@ -142,6 +184,8 @@ class RacksDBExec:
         except RacksDBError as err:
             logger.critical(err)
             sys.exit(1)
+        if getattr(self.args, "load_db", True) and self.args.expanded_cache:
+            logger.debug("Expanded objects cache: %s", self.db.expanded_cache_info())
 
     def _setup_logger(self):
         if self.args.debug:
@@ -163,6 +207,25 @@ class RacksDBExec:
     def _run_dump(self):
         print(DBDumperFactory.get("yaml")().dump(self.db._loader.content))
 
+    def _run_validate(self):
+        try:
+            errors = RacksDB.validate(
+                self.args.schema,
+                self.args.ext,
+                self.args.db,
+                self.args.cache,
+                self.args.workers,
+            )
+        except DBSchemaError as err:
+            logger.error("Error while loading schema: %s", err)
+            sys.exit(1)
+        if errors:
+            for error in errors:
+                logger.error(error)
+            logger.error("Found %d errors in database", len(errors))
+            sys.exit(1)
+        logger.info("Database is valid")
+
     def _run_racks(self):
         self._dump_view()
 
@@ -176,14 +239,17 @@ class RacksDBExec:
         self._dump_view()
 
     def _dump_view(self):
-        data = getattr(self.db, self.args.action)
         view = self.views[self.args.action]
-        # Filter data with optional filters specified in arguments
-        data = data.filter(
-            **{
+        # Filter data with optional filters specified in arguments. The filtered
+        # collection is built only when objects are dumped, names are selected
+        # while criteria are evaluated.
+        data = self.views.select(
+            self.db,
+            view,
+            {
                 _filter.name: getattr(self.args, _filter.name)
                 for _filter in view.filters
-            }
+            },
         )
 
         # Select only the item names
@@ -193,6 +259,8 @@ class RacksDBExec:
             if self.args.format is None:
                 self.args.format = "console"
             data = [item.name for item in data]
+        else:
+            data = data.materialize()
 
         # If the output format is not defined at this stage, fallback to default.
         if self.args.format is None:
@@ -5,12 +5,24 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import logging
+import importlib
+import itertools
+import operator
+import re
+import hashlib
+import io
+import os
+import sys
+import threading
+import concurrent.futures
+from collections import OrderedDict, namedtuple
 
 import yaml
 from ClusterShell.NodeSet import NodeSet
 
 from .errors import DBFormatError
 from .definedtype import SchemaDefinedType
+from .parser import yaml_load, YAML_BACKEND
 from .schema import (
     SchemaGenericValueType,
     SchemaNativeType,
@@ -26,18 +38,117 @@ from .schema import (
 logger = logging.getLogger(__name__)
 
 
-class DBObject:
+# Cache of dynamically generated classes, indexed by their names, bases and slots.
+_dynamic_classes = {}
+
+
+def dynamic_class(name, bases, slots=None):
+    """Return the class dynamically generated with the given name, tuple of bases and
+    optional tuple of slots. The class is generated once and then reused for all
+    instances."""
+    try:
+        return _dynamic_classes[(name, bases, slots)]
+    except KeyError:
+        namespace = dict()
+        if slots is not None:
+            namespace["__slots__"] = slots
+        return _dynamic_classes.setdefault(
+            (name, bases, slots), type(name, bases, namespace)
+        )
+
+
+def _restore_dynamic_instance(name, bases, slots):
+    """Return a new empty instance of the dynamically generated class with the given
+    name, bases and slots. This is used to restore objects from DB snapshots."""
+    cls = dynamic_class(name, bases, slots)
+    return cls.__new__(cls)
+
+
+class DBDynamicInstance:
+    """Mixin for classes whose instances can be pickled even though their classes are
+    dynamically generated with type(). These classes cannot be pickled by reference
+    as they are not defined in any module, they are generated again with the same
+    name, bases and slots when instances are unpickled."""
+
+    __slots__ = ()
+
+    def __reduce_ex__(self, protocol):
+        cls = type(self)
+        if getattr(sys.modules[cls.__module__], cls.__qualname__, None) is cls:
+            return super().__reduce_ex__(protocol)
+        return (
+            _restore_dynamic_instance,
+            (cls.__name__, cls.__bases__, cls.__dict__.get("__slots__")),
+            self.__getstate__(),
+        )
+
+    def __getstate__(self):
+        return vars(self)
+
+
+class DBObject(DBDynamicInstance):
+    """Base class of DB objects. The classes of loaded objects are dynamically
+    generated by GenericDB with slots for objects internal links and the properties
+    declared in schema. The attributes of DB objects must then be retrieved with
+    _vars() method instead of vars() builtin."""
+
+    __slots__ = ()
+
     LOADED_PREFIX = "__loaded_"
 
     def __init__(self, db, schema):
         self._db = db
         self._schema = schema
 
+    def __getstate__(self):
+        state = self._vars()
+        order = getattr(self, "_order", None)
+        if order is not None:
+            state["_order"] = order
+        return state
+
+    def __setstate__(self, state):
+        for attribute, value in state.items():
+            setattr(self, attribute, value)
+
+    def _vars(self):
+        """Return the dict of object attributes, as vars() builtin does for objects
+        without slots, in the order they have been assigned at load time when this
+        order is recorded in _order slot, or in slots declaration order otherwise."""
+        result = {}
+        for attribute in getattr(type(self), "__slots__", ()):
+            if attribute in ("__dict__", "_order"):
+                continue
+            try:
+                result[attribute] = getattr(self, attribute)
+            except AttributeError:
+                # Optional properties are not set in objects when missing in DB.
+                pass
+        if hasattr(self, "__dict__"):
+            result.update(vars(self))
+        order = getattr(self, "_order", None)
+        if order is None:
+            return result
+        ordered = {
+            attribute: result.pop(attribute)
+            for attribute in order
+            if attribute in result
+        }
+        ordered.update(result)
+        return ordered
+
     def _filter(self, **kwargs):
         """Abstract filter method, must be overriden in specialized bases module
         classes when filtering is needed."""
         return True
 
+    def _select(self, **kwargs):
+        """Generator of objects matching the provided filter criteria, ie. this
+        object if it matches the criteria. It can be overriden in specialized bases
+        module classes to select subsets of expandable objects."""
+        if self._filter(**kwargs):
+            yield self
+
     def _computed_props(self):
         """Generator to iterate over the list of DBObject computed properties."""
         if hasattr(self, "COMPUTED_PROPERTIES"):
@@ -45,110 +156,364 @@ class DBObject:
                 yield prop
 
 
-class DBExpandableObject(DBObject):
-    def _attributes(self):
-        """Return the dict of stable attributes, range attribues and the pair of range
-        attribute and value."""
-        stable_attributes = {}
-        range_attribute = None
-        rangeid_attributes = {}
-        for attribute, value in vars(self).items():
-            # Skip selection of special _key attribute at this stage, it is
-            # handled later when attributes are set on freshly instanciated
-            # object.
-            if attribute == "_key":
-                continue
-            if isinstance(value, DBObjectRange):
-                range_attribute = (attribute, value)
-            elif isinstance(value, DBObjectRangeId):
-                rangeid_attributes[attribute] = value
-            else:
-                stable_attributes[attribute] = value
-        return stable_attributes, range_attribute, rangeid_attributes
+DBExpandedCacheInfo = namedtuple(
+    "DBExpandedCacheInfo", ["hits", "misses", "size", "maxsize"]
+)
 
-    def _instanciate_obj(
-        self, index, value, range_attribute, rangeid_attributes, stable_attributes
-    ):
-        """Instanciate the object at the given index."""
 
-        _attributes = stable_attributes.copy()
-        _attributes[range_attribute[0]] = value
-        for rangeid_name, rangeid_value in rangeid_attributes.items():
-            _attributes[rangeid_name] = rangeid_value.index(index)
+class DBExpandedCache:
+    """Memoized expanded objects of all the expandable objects of a DB, indexed by
+    expandable objects and positions in their ranges, so that the same instances
+    are returned by repeated iterations. When the cache is full, the least recently
+    used expanded objects are evicted. The cache can be shared by multiple threads,
+    as in racksdb-web application."""
+
+    def __init__(self, maxsize):
+        # Maximum number of memoized expanded objects
+        self.maxsize = maxsize
+        # The expandable objects are referenced by the memoized expanded objects,
+        # their ids cannot be reused while they are in cache.
+        self._objects = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Lock to protect memoized objects and statistics from concurrent updates
+        self._lock = threading.Lock()
+
+    def get(self, cls, expandable, index):
+        """Return the memoized expanded object of the given expandable object at the
+        given index, or a new expanded object of the given class."""
+        key = (id(expandable), index)
+        with self._lock:
+            try:
+                result = self._objects[key]
+            except KeyError:
+                self.misses += 1
+                result = cls(expandable, index)
+                self._objects[key] = result
+                if len(self._objects) > self.maxsize:
+                    self._objects.popitem(last=False)
+                return result
+            self._objects.move_to_end(key)
+            self.hits += 1
+            return result
 
-        bases = [DBObject]
-        # Add provided module base if defined
-        try:
-            # Insert bases module class in the beginning of the list to make
-            # sure methods from this classes are called over the methods from
-            # DBObject.
-            bases.insert(
-                0,
-                getattr(
-                    self._db._bases,
-                    f"{self._db._prefix}{self._schema.name}Base",
-                ),
+    def clear(self):
+        """Remove all memoized expanded objects."""
+        with self._lock:
+            self._objects.clear()
+
+    def cache_info(self):
+        """Return statistics of expanded objects cache."""
+        with self._lock:
+            return DBExpandedCacheInfo(
+                self.hits, self.misses, len(self._objects), self.maxsize
             )
-        except AttributeError:
-            pass
-        obj = type(f"{self._db._prefix}{self._schema.name}", tuple(bases), dict())(
-            self._db, self._schema
-        )
-        for attr_name, attr_value in _attributes.items():
-            setattr(obj, attr_name, attr_value)
-            # Set object _key attribute if property is a key
-            prop = self._schema.prop(attr_name)
-            if prop is not None and prop.key:
-                setattr(obj, "_key", attr_value)
-        return obj
+
+
+class DBExpandableObject(DBObject):
+    __slots__ = ()
+
+    def _range(self):
+        """Return the DBObjectRange attribute of the object."""
+        for value in self._vars().values():
+            if isinstance(value, DBObjectRange):
+                return value
+        raise AttributeError(f"Unable to find range attribute of {self}")
+
+    def expanded(self, index):
+        """Return the expanded object at the given index in the range."""
+        cls = self._db.object_class(self._schema)
+        cache = self._db._expanded_cache
+        if cache is None:
+            return cls(self, index)
+        return cache.get(cls, self, index)
+
+    def iterobjects(self):
+        """Iterate over all expanded objects. The expanded objects are lightweight
+        views on this object, instanciated while iterating or retrieved from the
+        expanded objects cache of the DB when enabled."""
+        cls = self._db.object_class(self._schema)
+        cache = self._db._expanded_cache
+        for index in range(len(self._range())):
+            if cache is None:
+                yield cls(self, index)
+            else:
+                yield cache.get(cls, self, index)
 
     def objects(self):
         """Return the list of all expanded objects."""
-        result = []
-        stable_attributes, range_attribute, rangeid_attributes = self._attributes()
-        first = None
-        for index, value in enumerate(range_attribute[1].expanded()):
-            obj = self._instanciate_obj(
-                index, value, range_attribute, rangeid_attributes, stable_attributes
-            )
-            if first is None:
-                first = obj
-            setattr(obj, "_first", first)
-            result.append(obj)
+        return list(self.iterobjects())
+
+    def subsets(self, rangeset):
+        """Generator of expandable objects restricted to the names of the range that
+        are in the given NodeSet. This object is generated when all its names are in
+        the NodeSet. Otherwise, a new expandable object is generated for each run of
+        consecutive positions in the range, with rangeid attributes shifted to the
+        position of the run, so that its expanded objects have the same attributes
+        as the expanded objects of this object."""
+        _range = self._range()
+        matches = _range.rangeset & rangeset
+        if not matches:
+            return
+        if len(matches) == len(_range):
+            yield self
+            return
+        # List of runs of consecutive positions, as pairs of index of the first
+        # name of the run in matches and position of this name in the range.
+        runs = []
+        last = None
+        for index, name in enumerate(matches):
+            position = _range.index_of(name)
+            if last is None or position != last + 1:
+                runs.append((index, position))
+            last = position
+        runs.append((len(matches), None))
+        for (index, position), (end, _) in zip(runs, runs[1:]):
+            yield self._subset(matches[index:end], position)
+
+    def _subset(self, rangeset, position):
+        """Return a copy of this object with the given NodeSet as range, starting at
+        the given position in the range of this object."""
+        state = self.__getstate__()
+        # Ranges are replaced by identity, as the range is also the key of the
+        # object.
+        ranges = {}
+        for attribute, value in state.items():
+            if isinstance(value, DBObjectRange):
+                if id(value) not in ranges:
+                    ranges[id(value)] = DBObjectRange(rangeset)
+                state[attribute] = ranges[id(value)]
+            elif isinstance(value, DBObjectRangeId):
+                state[attribute] = DBObjectRangeId(value.start + position)
+        result = type(self).__new__(type(self))
+        result.__setstate__(state)
         return result
 
     def getobject(self, key):
-        """Return an instance of the object with provided key. The first object is also
-        instanciated and linked in _first attribute."""
-        stable_attributes, range_attribute, rangeid_attributes = self._attributes()
-        first = None
-        for index, value in enumerate(range_attribute[1].expanded()):
-            if first and value != key:
-                continue
-            obj = self._instanciate_obj(
-                index, value, range_attribute, rangeid_attributes, stable_attributes
-            )
-            if first is None:
-                first = obj
-            setattr(obj, "_first", first)
-            if value == key:
-                return obj
+        """Return the expanded object with provided key."""
+        _range = self._range()
+        try:
+            return self.expanded(_range.index_of(key))
+        except ValueError:
+            raise KeyError(f"key '{key}' not found in {str(_range)}")
+
+
+class DBExpandedObject(DBObject):
+    """Expanded object of a DBExpandableObject, as a lightweight view on the
+    expandable object at a given index in its range. The attributes shared by all
+    expanded objects are resolved from the expandable object, the range and rangeid
+    attributes are computed with the index on access. The classes of expanded
+    objects have _expandable and _index slots only."""
+
+    __slots__ = ()
+
+    def __init__(self, expandable, index):
+        self._expandable = expandable
+        self._index = index
+
+    def __getattr__(self, name):
+        # Avoid infinite recursion when the slots are not set yet, while the object
+        # is restored from DB snapshot.
+        if name in ("_expandable", "_index"):
+            raise AttributeError(name)
+        return self._expanded_value(getattr(self._expandable, name))
+
+    def __eq__(self, other):
+        if not isinstance(other, DBExpandedObject):
+            return NotImplemented
+        return self._expandable is other._expandable and self._index == other._index
+
+    def __hash__(self):
+        return hash((id(self._expandable), self._index))
+
+    def __getstate__(self):
+        return {"_expandable": self._expandable, "_index": self._index}
+
+    @property
+    def _first(self):
+        """First expanded object of the range of this object."""
+        return self._expandable.expanded(0)
+
+    def _expanded_value(self, value):
+        if isinstance(value, DBObjectRange):
+            return value.name_at(self._index)
+        if isinstance(value, DBObjectRangeId):
+            return value.index(self._index)
+        return value
+
+    def _vars(self):
+        # As expanded objects used to be copies of their expandable objects, the
+        # range attribute and then the rangeid attributes are set after the shared
+        # attributes.
+        result = {}
+        ranges = {}
+        rangeids = {}
+        for attribute, value in self._expandable._vars().items():
+            if isinstance(value, DBObjectRange):
+                ranges[attribute] = self._expanded_value(value)
+            elif isinstance(value, DBObjectRangeId):
+                rangeids[attribute] = self._expanded_value(value)
+            else:
+                result[attribute] = value
+        result.update(ranges)
+        result.update(rangeids)
+        return result
+
 
-        raise KeyError(f"key '{key}' not found in {str(range_attribute[1])}")
+class DBObjectRange(DBDynamicInstance):
+    """Range of names of expandable objects. The names are computed with their
+    positions in the range by arithmetic when the range has a single pattern with a
+    single dimension (ex: mecn[0001-0040,0050-0060]), or with the expanded list of
+    names for other ranges."""
 
+    # Folded range with a single pattern and a single dimension, with the prefix,
+    # the ranges of numbers and the suffix.
+    FOLDED_PATTERN = re.compile(r"^([^\[\],]*)\[([\d,/-]+)\]([^\[\],]*)$")
+    # Range of numbers in folded range, with optional step.
+    FOLDED_RANGE = re.compile(r"^(\d+)(?:-(\d+)(?:/(\d+))?)?$")
 
-class DBObjectRange:
     def __init__(self, rangeset):
         self.rangeset = NodeSet(rangeset)
+        self._reset()
+
+    def _reset(self):
+        # Tuple of prefix, suffix and list of ranges of numbers for arithmetic on
+        # positions, computed on first access, or False if the range is not
+        # eligible.
+        self._arithmetic = None
+        # Tuple of expanded names and dict of their positions, computed on first
+        # access for ranges not eligible to arithmetic.
+        self._names = None
+        self._positions = None
+
+    def __getstate__(self):
+        # Computed positions data are not saved in DB snapshots.
+        return {"rangeset": self.rangeset}
+
+    def __setstate__(self, state):
+        self.rangeset = state["rangeset"]
+        self._reset()
+
+    def _ranges(self):
+        """Return the tuple of prefix, suffix, list of (start, stop, step, padding,
+        offset) ranges of numbers, with offset the position of the first number of
+        the range, and total size, or None if the range is not eligible to
+        arithmetic."""
+        if self._arithmetic is None:
+            self._arithmetic = self._parse() or False
+        return self._arithmetic or None
+
+    def _parse(self):
+        match = self.FOLDED_PATTERN.match(str(self.rangeset))
+        if match is None:
+            return None
+        prefix, folded, suffix = match.groups()
+        ranges = []
+        offset = 0
+        for item in folded.split(","):
+            _match = self.FOLDED_RANGE.match(item)
+            if _match is None:
+                return None
+            first, last, step = _match.groups()
+            padding = len(first) if first.startswith("0") and len(first) > 1 else 0
+            start = int(first)
+            stop = int(last) + 1 if last is not None else start + 1
+            step = int(step) if step is not None else 1
+            ranges.append((start, stop, step, padding, offset))
+            offset += len(range(start, stop, step))
+        # Check the ranges cover the whole range, in case of unexpected folding.
+        if offset != len(self.rangeset):
+            return None
+        return prefix, suffix, ranges, offset
+
+    def _expanded(self):
+        """Return the tuple of expanded names and the dict of their positions."""
+        if self._names is None:
+            self._names = tuple(self.rangeset)
+            self._positions = {name: index for index, name in enumerate(self._names)}
+        return self._names, self._positions
+
+    def __len__(self):
+        return len(self.rangeset)
+
+    def __iter__(self):
+        """Iterate over the expanded names of the range, without expanding the whole
+        range."""
+        ranges = self._ranges()
+        if ranges is None:
+            yield from self.rangeset
+            return
+        prefix, suffix, ranges, _ = ranges
+        for start, stop, step, padding, _ in ranges:
+            for number in range(start, stop, step):
+                yield f"{prefix}{number:0{padding}d}{suffix}"
+
+    def __contains__(self, name):
+        try:
+            self.index_of(name)
+        except ValueError:
+            return False
+        return True
+
+    def __getitem__(self, index):
+        """Return the expanded name at the given index, or the list of expanded names
+        of the given slice."""
+        if isinstance(index, slice):
+            return [self.name_at(_index) for _index in range(*index.indices(len(self)))]
+        return self.name_at(index)
+
+    def name_at(self, index):
+        """Return the expanded name at the given index in the range. Raise IndexError
+        if the index is out of range."""
+        ranges = self._ranges()
+        if ranges is None:
+            return self._expanded()[0][index]
+        prefix, suffix, ranges, size = ranges
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError(f"index {index} out of range {self}")
+        for start, stop, step, padding, offset in reversed(ranges):
+            if index >= offset:
+                number = start + (index - offset) * step
+                return f"{prefix}{number:0{padding}d}{suffix}"
+
+    def index_of(self, name):
+        """Return the index of the given expanded name in the range. Raise
+        ValueError if the name is not in the range."""
+        ranges = self._ranges()
+        if ranges is None:
+            try:
+                return self._expanded()[1][name]
+            except (KeyError, TypeError):
+                raise ValueError(f"{name} is not in range {self}")
+        prefix, suffix, ranges, _ = ranges
+        if (
+            isinstance(name, str)
+            and name.startswith(prefix)
+            and name.endswith(suffix)
+            and len(name) > len(prefix) + len(suffix)
+        ):
+            digits = name[len(prefix) : len(name) - len(suffix)]
+            if digits.isdigit():
+                number = int(digits)
+                for start, stop, step, padding, offset in ranges:
+                    if (
+                        start <= number < stop
+                        and (number - start) % step == 0
+                        and f"{number:0{padding}d}" == digits
+                    ):
+                        return offset + (number - start) // step
+        raise ValueError(f"{name} is not in range {self}")
 
     def expanded(self):
-        return list(self.rangeset)
+        return list(self)
 
     def __repr__(self):
         return str(self.rangeset)
 
 
-class DBObjectRangeId:
+class DBObjectRangeId(DBDynamicInstance):
     def __init__(self, start):
         self.start = start
 
@@ -156,18 +521,143 @@ class DBObjectRangeId:
         return self.start + value
 
 
+class DBLoaderStep:
+    """Step of DBLoaderPlan to load one property of objects."""
+
+    def __init__(self, prop: SchemaProperty):
+        self.prop = prop
+        self.attribute = prop.name
+        if self.attribute.endswith("[]"):
+            self.attribute = self.attribute[:-2]
+        # SchemaObject of this property, or of the content of this property list,
+        # None if the property does not contain objects.
+        self.type = None
+        # Set of SchemaObjects referenced in this property sub-objects, which must be
+        # loaded before this property.
+        self.refs = set()
+        # Set of SchemaObjects loaded with this property sub-objects.
+        self.subobjs = set()
+        # List of back references to properties of parent objects in this property
+        # sub-objects properties.
+        self.back_references = []
+        # Set of (SchemaObject, property name) of all back references to
+        # properties of parent objects in this property sub-objects, recursively.
+        self.nested_back_references = set()
+        subtype = prop.type
+        # If the property is a list, consider the content of the list.
+        if isinstance(subtype, SchemaContainerList):
+            subtype = subtype.content
+        if not isinstance(subtype, SchemaObject):
+            return
+        self.type = subtype
+        self.refs = subtype.refs - subtype.subobjs
+        self.subobjs = subtype.subobjs
+        for subobj in {subtype} | subtype.subobjs:
+            for subprop in subobj.properties:
+                if (
+                    isinstance(subprop.type, SchemaBackReference)
+                    and subprop.type.prop is not None
+                ):
+                    if subobj is subtype:
+                        self.back_references.append(subprop.type)
+                    self.nested_back_references.add(
+                        (subprop.type.obj, subprop.type.prop)
+                    )
+
+    def depends(self, schema_object: SchemaObject, step):
+        """Return True if this step must be run after the given step of the same
+        SchemaObject plan."""
+        return bool(self.refs & step.subobjs) or (
+            (schema_object, step.prop.name) in self.nested_back_references
+        )
+
+
+class DBLoaderPlan:
+    """Plan to load objects of a SchemaObject, compiled once per SchemaObject. The
+    steps are ordered to load the properties after the sub-objects they reference
+    and after the properties targeted by back references in their sub-objects, so
+    that objects attributes are usually loaded in a single pass."""
+
+    def __init__(self, schema_object: SchemaObject):
+        self.schema_object = schema_object
+        # Dict of steps indexed by properties names
+        self.steps = {
+            prop.name: DBLoaderStep(prop) for prop in schema_object.properties
+        }
+        # Sort steps topologically, in properties declaration order when
+        # possible. In case of circular dependencies, the first remaining step is
+        # picked. The attributes are then loaded in multiple passes, as long as
+        # their references are eventually resolved.
+        self.ordered = []
+        remaining = list(self.steps.values())
+        while remaining:
+            for step in remaining:
+                if not any(
+                    step.depends(schema_object, other)
+                    for other in remaining
+                    if other is not step
+                ):
+                    break
+            else:
+                step = remaining[0]
+            remaining.remove(step)
+            self.ordered.append(step)
+        logger.debug(
+            "Loader plan of %s: %s",
+            schema_object,
+            [step.prop.name for step in self.ordered],
+        )
+
+
 class DBList(list):
     def __iter__(self):
         for item in super().__iter__():
             if isinstance(item, DBExpandableObject):
-                for expanded_item in item.objects():
-                    yield expanded_item
+                yield from item.iterobjects()
             else:
                 yield item
 
     def __len__(self):
-        """Return the number of values in the list."""
-        return len([value for value in self])
+        """Return the number of values in the list. It counts the number of values in
+        expandable objects with the size of their ranges, without requiring
+        instanciation of expanded objects."""
+        values = 0
+        for item in self.itervalues():
+            if isinstance(item, DBExpandableObject):
+                values += len(item._range())
+            else:
+                values += 1
+        return values
+
+    def __getitem__(self, index):
+        """Return the value at the given index among the expanded values of the list,
+        or the list of expanded values of the given slice. Only the expanded object
+        at the given index is instanciated."""
+        if isinstance(index, slice):
+            return [value for value in self][index]
+        index = operator.index(index)
+        if index < 0:
+            index += len(self)
+        if index >= 0:
+            for item in self.itervalues():
+                if not isinstance(item, DBExpandableObject):
+                    if index == 0:
+                        return item
+                    index -= 1
+                    continue
+                size = len(item._range())
+                if index < size:
+                    return item.expanded(index)
+                index -= size
+        raise IndexError("list index out of range")
+
+    def first(self):
+        """Return the first expanded value of the list."""
+        return self[0]
+
+    def frozen(self):
+        """Return a read-only copy of the list."""
+        return DBFrozenList(self.itervalues())
 
     def itervalues(self):
         """Additional iterators over the list values that does not trigger expansion of
@@ -175,46 +665,119 @@ class DBList(list):
         for item in super().__iter__():
             yield item
 
-    def filter(self, **kwargs):
+    def __reduce_ex__(self, protocol):
+        # By default, list items are pickled with the list iterator which expands
+        # DBExpandableObjects. Pickle the folded values instead.
+        return (type(self), (), None, self.itervalues())
+
+    def filter(self, lazy=False, **kwargs):
         """Return a copy of the current DBList without values that do not match provided
-        filter criteria."""
-        result = DBList()
-        for item in self:
-            if item._filter(**kwargs):
-                result.append(item)
-        return result
+        filter criteria. When lazy is True, a DBFilterView is returned instead of
+        a copy."""
+        view = DBFilterView(self, (kwargs,))
+        if lazy:
+            return view
+        return view.materialize()
+
+
+def _readonly(self, *args, **kwargs):
+    raise TypeError(f"'{type(self).__name__}' object is read-only")
+
+
+class DBFrozenList(DBList):
+    """Read-only DBList, for collections computed once and cached in DB."""
+
+    append = extend = insert = remove = pop = clear = sort = reverse = _readonly
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+
+    def __reduce_ex__(self, protocol):
+        return (type(self), (list(self.itervalues()),))
 
 
 class DBDict(dict):
-    def filter(self, **kwargs):
+    # Index of expanded keys of DBObjectRange keys to the pairs of range keys and
+    # positions in ranges, built on first lookup of an expanded key and reset
+    # when the dictionnary is modified.
+    _expanded_keys = None
+
+    def _reset(method):
+        def wrapper(self, *args, **kwargs):
+            self._expanded_keys = None
+            return method(self, *args, **kwargs)
+
+        wrapper.__name__ = method.__name__
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+
+    __setitem__ = _reset(dict.__setitem__)
+    __delitem__ = _reset(dict.__delitem__)
+    clear = _reset(dict.clear)
+    pop = _reset(dict.pop)
+    popitem = _reset(dict.popitem)
+    setdefault = _reset(dict.setdefault)
+    update = _reset(dict.update)
+    __ior__ = _reset(dict.__ior__)
+    del _reset
+
+    def __getstate__(self):
+        # The index of expanded keys is not saved in DB snapshots.
+        return None
+
+    def filter(self, lazy=False, **kwargs):
         """Return a copy of the current DBDict without key and values that do not match
-        provided filter criteria."""
-        result = DBDict()
-        for key, value in self.items():
-            if value._filter(**kwargs):
-                result[key] = value
-        return result
+        provided filter criteria. When lazy is True, a DBFilterView is returned
+        instead of a copy."""
+        view = DBFilterView(self, (kwargs,))
+        if lazy:
+            return view
+        return view.materialize()
 
     def __iter__(self):
         for item in self.values():
             if isinstance(item, DBExpandableObject):
-                for expanded_item in item.objects():
-                    yield expanded_item
+                yield from item.iterobjects()
             else:
                 yield item
 
     def __getitem__(self, key):
         # Try to get the item from parent dict. If the key cannot be found in dict,
-        # search for the key in all DBObjectRange keys. If found, return an instance
-        # of this particular expanded object.
+        # search for the key in the index of expanded keys of DBObjectRange keys.
+        # If found, return this particular expanded object at its position in
+        # range.
         try:
             return super().__getitem__(key)
         except KeyError:
-            for _key in self.keys():
-                if isinstance(_key, DBObjectRange) and key in _key.rangeset:
-                    return super().__getitem__(_key).getobject(key)
+            if self._expanded_keys is None:
+                self._expanded_keys = self._index_expanded_keys()
+            try:
+                _key, position = self._expanded_keys[key]
+            except KeyError:
+                raise KeyError(key)
+            return super().__getitem__(_key).expanded(position)
+
+    def folded_key(self, key):
+        """Return the key of the dictionnary for the given key, ie. the key itself or
+        the DBObjectRange key that contains the given expanded key. Raise KeyError
+        if the key is not found."""
+        if super().__contains__(key):
+            return key
+        if self._expanded_keys is None:
+            self._expanded_keys = self._index_expanded_keys()
+        try:
+            return self._expanded_keys[key][0]
+        except KeyError:
             raise KeyError(key)
 
+    def _index_expanded_keys(self):
+        """Return the dict of expanded keys of DBObjectRange keys with the pairs of
+        range keys and positions in ranges."""
+        result = {}
+        for _key in self.keys():
+            if isinstance(_key, DBObjectRange):
+                for position, name in enumerate(_key):
+                    result.setdefault(name, (_key, position))
+        return result
+
     def __len__(self):
         """Return the number of values in the dictionnary. It counts the number of
         values in expandable objects by counting the number of values in the rangeset
@@ -222,66 +785,759 @@ class DBDict(dict):
         values = 0
         for key in self.keys():
             if isinstance(key, DBObjectRange):
-                values += len(key.rangeset)
+                values += len(key)
             else:
                 values += 1
         return values
 
+    def frozen(self):
+        """Return a read-only copy of the dictionnary."""
+        return DBFrozenDict(self.items())
+
     def first(self):
-        """Return the first expanded object of the dictionnary."""
-        return list(self)[0]  # list() calls __iter__()
+        """Return the first expanded object of the dictionnary, without instanciating
+        the other expanded objects."""
+        for value in self:
+            return value
+        raise IndexError("first(): empty dictionnary")
+
+
+class DBFrozenDict(DBDict):
+    """Read-only DBDict, for collections computed once and cached in DB."""
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce_ex__(self, protocol):
+        return (type(self), (dict(self.items()),))
+
+
+class DBFilterView:
+    """Lazy view of the values of a DBList or DBDict that match filter criteria.
+    The criteria are evaluated while the values are consumed, the view can be
+    filtered again with additional criteria and it is converted into a concrete
+    DBList or DBDict with materialize()."""
+
+    def __init__(self, source, criteria):
+        self._source = source
+        # Tuple of filter criteria dicts, all matched by the selected values
+        self._criteria = criteria
+
+    def filter(self, **kwargs):
+        """Return a new view with additional filter criteria."""
+        return DBFilterView(self._source, self._criteria + (kwargs,))
+
+    @staticmethod
+    def _select(items, kwargs):
+        for key, value in items:
+            # Values can be selected entirely or partially, in case of subsets of
+            # expandable objects.
+            for obj in value._select(**kwargs):
+                yield key if obj is value else obj._key, obj
+
+    def _items(self):
+        """Generator of pairs of keys and selected values. Values of DBDict are
+        selected without expansion of expandable objects, while values of DBList
+        are selected among expanded values with None keys."""
+        if isinstance(self._source, DBDict):
+            items = self._source.items()
+        else:
+            items = ((None, item) for item in self._source)
+        for kwargs in self._criteria:
+            items = self._select(items, kwargs)
+        return items
+
+    def itervalues(self):
+        """Generator of selected values, without expansion of
+        DBExpandableObjects."""
+        for _, value in self._items():
+            yield value
+
+    def __iter__(self):
+        for item in self.itervalues():
+            if isinstance(item, DBExpandableObject):
+                yield from item.iterobjects()
+            else:
+                yield item
+
+    def __len__(self):
+        """Return the number of selected values. Criteria are evaluated on all
+        values but the selected expandable objects are counted with the sizes of
+        their ranges, without instanciation of expanded objects."""
+        values = 0
+        for item in self.itervalues():
+            if isinstance(item, DBExpandableObject):
+                values += len(item._range())
+            else:
+                values += 1
+        return values
+
+    def __bool__(self):
+        for _ in self.itervalues():
+            return True
+        return False
+
+    def __getitem__(self, index):
+        """Return the selected value at the given index, or the list of selected
+        values of the given slice. Criteria are evaluated only up to the requested
+        values, unless negative indexes are given."""
+        if isinstance(index, slice):
+            if any(
+                value is not None and value < 0
+                for value in (index.start, index.stop, index.step)
+            ):
+                return list(self)[index]
+            return list(itertools.islice(self, index.start, index.stop, index.step))
+        index = operator.index(index)
+        if index < 0:
+            return list(self)[index]
+        for value in itertools.islice(self, index, None):
+            return value
+        raise IndexError("view index out of range")
+
+    def first(self):
+        """Return the first selected value, without evaluating criteria on the
+        following values."""
+        for value in self:
+            return value
+        raise IndexError("first(): empty view")
+
+    def materialize(self):
+        """Return a new DBDict or DBList with the selected values, depending on the
+        type of the source collection."""
+        if isinstance(self._source, DBDict):
+            result = DBDict()
+            for key, value in self._items():
+                result[key] = value
+            return result
+        return DBList(self.itervalues())
 
 
 class DBFileLoader:
     def __init__(self, path):
-        with open(path) as fh:
-            try:
-                self.content = yaml.safe_load(fh)
-            except yaml.composer.ComposerError as err:
-                raise DBFormatError(err)
+        self.path = path
+        with open(path, "rb") as fh:
+            stat = os.fstat(fh.fileno())
+            # Modification time and size of file, used to detect modifications.
+            self.stats = (stat.st_mtime_ns, stat.st_size)
+            # File is parsed from an in-memory buffer named after the file, so that
+            # its content is read once to compute its digest and parse it.
+            stream = io.BytesIO(fh.read())
+            stream.name = fh.name
+        # Digest of file content, used to ignore modifications that do not alter
+        # the content.
+        self.digest = hashlib.sha256(stream.getbuffer()).hexdigest()
+        self._content = self._parse(stream)
+
+    @property
+    def content(self):
+        """Parsed content of the file. When restored from DB snapshot without its
+        content, the file is parsed again on first access."""
+        try:
+            return self._content
+        except AttributeError:
+            with open(self.path, "rb") as fh:
+                self._content = self._parse(fh)
+            return self._content
+
+    def _parse(self, stream):
+        try:
+            return yaml_load(stream)
+        except yaml.YAMLError as err:
+            raise DBFormatError(err)
+
+    def __getstate__(self):
+        # Parsed content is not saved in DB snapshots, only the state required to
+        # detect modifications of the file.
+        state = vars(self).copy()
+        state.pop("_content", None)
+        return state
 
 
 class DBSplittedFilesLoader:
-    def __init__(self, path):
+    """Load DB content splitted in a tree of YAML files. The tree is walked first to
+    find all files, the files are then parsed, sequentially or in parallel by a
+    pool of threads when workers > 1, and the content is finally assembled following
+    the tree structure. Threads are used as loading a large number of files is
+    mostly bound to I/O latency, especially on network filesystems.
+
+    The loader keeps the tree of files and their parsed contents, so that only the
+    modified files are parsed again by refresh().
+
+    In lazy mode, the files of top-level keys of DB content are parsed on first
+    access to these keys with get()."""
+
+    def __init__(self, path, workers=1, lazy=False):
+        self.path = path
+        self.workers = workers
+        self.lazy = lazy
+        files = []
+        self.tree = self._walk(path, files)
+        # Dict of DBFileLoader of all parsed files, indexed by their paths.
+        self.files = {}
+        # DB content, assembled when all files are parsed.
+        self._content = None
+        if not self.lazy:
+            self.files = self._load_files(files)
+
+    @property
+    def content(self):
+        """DB content, all the files are parsed if not already done."""
+        if self._content is None:
+            self._parse(self.tree)
+            self._content = self._build(self.tree, self.files)
+        return self._content
+
+    def __getstate__(self):
+        # Assembled DB content is not saved in DB snapshots, it is assembled again
+        # when requested.
+        state = vars(self).copy()
+        state["_content"] = None
+        return state
+
+    def keys(self):
+        """Return the list of top-level keys of DB content."""
+        if isinstance(self.tree, dict):
+            return list(self.tree.keys())
+        return list(self.content.keys())
+
+    def get(self, key):
+        """Return the DB content of the given top-level key, its files are parsed if
+        not already done. Raise KeyError if the key is not found."""
+        if self._content is None and isinstance(self.tree, dict):
+            subtree = self.tree[key]
+            self._parse(subtree)
+            return self._build(subtree, self.files)
+        return self.content[key]
+
+    def refresh(self):
+        """Walk the tree of DB files again, parse the files added or modified since
+        last load and assemble the updated DB content. Return the set of top-level
+        keys of DB content whose files have been added, modified or removed. The
+        files of top-level keys not accessed yet in lazy mode are ignored. The
+        loader is left unmodified when an error is encountered."""
+        paths = []
+        tree = self._walk(self.path, paths)
+        splitted = isinstance(tree, dict) and isinstance(self.tree, dict)
+        if splitted:
+            # Top-level keys whose files have been parsed, or all top-level keys
+            # when not in lazy mode.
+            parsed = [
+                key
+                for key in set(tree) | set(self.tree)
+                if not self.lazy
+                or (
+                    key in self.tree
+                    and all(
+                        path in self.files for path in self._tree_files(self.tree[key])
+                    )
+                )
+            ]
+            paths = [
+                path
+                for key in parsed
+                if key in tree
+                for path in self._tree_files(tree[key])
+            ]
+        elif self.lazy and not self.files:
+            # DB is not a directory and it has not been parsed yet.
+            paths = []
+        loaders = self._load_files(
+            [
+                path
+                for path in paths
+                if path not in self.files or self.files[path].stats != self._stats(path)
+            ]
+        )
+        # Files whose content has actually changed
+        changed = {
+            path
+            for path, loader in loaders.items()
+            if path not in self.files or self.files[path].digest != loader.digest
+        }
+        files = {path: loaders.get(path, self.files.get(path)) for path in paths}
+        if splitted:
+            keys = {
+                key
+                for key in parsed
+                if tree.get(key) != self.tree.get(key)
+                or not changed.isdisjoint(self._tree_files(tree[key]))
+            }
+        elif paths and (tree != self.tree or changed):
+            # DB is not a directory, all its content is considered changed.
+            keys = set(self._keys(self.tree, self.files)) | set(self._keys(tree, files))
+        else:
+            keys = set()
+        logger.debug(
+            "Refreshed DB files, %d parsed, %d changed, changed keys: %s",
+            len(loaders),
+            len(changed),
+            keys,
+        )
+        self.tree = tree
+        self.files = files
+        self._content = None
+        return keys
+
+    def state(self):
+        """Return the current state of the loader, to be restored with restore()."""
+        return (self.tree, dict(self.files), self._content)
+
+    def restore(self, state):
+        """Restore the loader in the given state returned by state(), so that the
+        files refreshed since then are detected as modified on next refresh()."""
+        self.tree, files, self._content = state
+        self.files = dict(files)
+
+    def paths(self):
+        """Return the list of paths of all DB files."""
+        return list(self._tree_files(self.tree))
+
+    def assemble(self, contents):
+        """Return the DB content assembled following the tree of DB files with the
+        given contents of files, indexed by their paths."""
+        return self._assemble(self.tree, contents.__getitem__)
+
+    def _keys(self, tree, files):
+        """Return the top-level keys of the given tree with parsed files."""
+        if isinstance(tree, dict):
+            return tree.keys()
+        return self._build(tree, files).keys()
+
+    def _parse(self, tree):
+        """Parse the files of the given tree not already parsed."""
+        paths = [path for path in self._tree_files(tree) if path not in self.files]
+        if paths:
+            self.files.update(self._load_files(paths))
+
+    def _stats(self, path):
+        stat = path.stat()
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _walk(self, path, files):
+        """Return the tree of DB files in path, with Path for files, list for .l
+        directories and dict indexed by stems for other directories. The files are
+        also appended to the files list argument in walk order."""
         # try the parent folder
         if not path.exists():
             raise DBFormatError(f"DB path {path} does not exist")
         elif path.is_file():
             if not path.name.endswith(".yml"):
                 raise DBFormatError(f"DB contains file {path} without .yml extension")
-            logger.debug("Loading DB file %s", path)
-            self.content = DBFileLoader(path).content
+            files.append(path)
+            return path
         elif path.suffix == ".l":
-            self.content = []
-            for item in path.iterdir():
-                self.content.append(DBSplittedFilesLoader(item).content)
+            return [self._walk(item, files) for item in path.iterdir()]
         else:
-            # if directory, load recursively
-            self.content = {}
-            for item in path.iterdir():
-                logger.debug("Loading DB directory %s", path)
-                self.content[item.stem] = DBSplittedFilesLoader(item).content
+            # if directory, walk recursively
+            logger.debug("Loading DB directory %s", path)
+            return {item.stem: self._walk(item, files) for item in path.iterdir()}
+
+    def _tree_files(self, tree):
+        """Iterate over all files of the given tree."""
+        if isinstance(tree, list):
+            for item in tree:
+                yield from self._tree_files(item)
+        elif isinstance(tree, dict):
+            for item in tree.values():
+                yield from self._tree_files(item)
+        else:
+            yield tree
+
+    def _load_files(self, paths):
+        """Return dict of DBFileLoader of the given paths."""
+        if self.workers > 1 and len(paths) > 1:
+            logger.debug(
+                "Loading %d DB files with %d workers", len(paths), self.workers
+            )
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers
+            ) as executor:
+                loaders = list(executor.map(self._load_file, paths))
+        else:
+            loaders = [self._load_file(path) for path in paths]
+        return dict(zip(paths, loaders))
+
+    def _load_file(self, path):
+        logger.debug("Loading DB file %s with %s YAML parser", path, YAML_BACKEND)
+        return DBFileLoader(path)
+
+    def _build(self, tree, files):
+        """Return the DB content of the given tree with parsed files contents."""
+        return self._assemble(tree, lambda path: files[path].content)
+
+    def _assemble(self, tree, content):
+        """Return the DB content of the given tree with the content function called
+        with files paths."""
+        if isinstance(tree, list):
+            return [self._assemble(item, content) for item in tree]
+        elif isinstance(tree, dict):
+            return {stem: self._assemble(item, content) for stem, item in tree.items()}
+        return content(tree)
 
 
 class GenericDB(DBObject):
+    # Memoized expanded objects, disabled by default. It is not saved in DB
+    # snapshots.
+    _expanded_cache = None
+
     def __init__(self, prefix, schema, bases):
         super().__init__(self, schema)
         self._prefix = prefix
         # Module of base classes for instanciated DB objects
         self._bases = bases
         self._indexes = {}  # objects indexes
+        # Objects key indexes, ie. hash of (object type name, property name) to a
+        # hash of property values to objects, for key properties and properties
+        # targeted by references. Expandable objects are indexed by all their
+        # expanded names.
+        self._keys = {}
+        # Sets of names of properties indexed in key indexes, by object type name
+        self._indexed = {}
+        for schema_object in [schema.content, *schema.objects.values()]:
+            for prop in schema_object.properties:
+                if prop.key:
+                    self._indexed.setdefault(schema_object.name, set()).add(prop.name)
+                subtype = prop.type
+                if isinstance(subtype, SchemaContainerList):
+                    subtype = subtype.content
+                if isinstance(subtype, SchemaReference):
+                    self._indexed.setdefault(subtype.obj.name, set()).add(subtype.prop)
         # Set of SchemaObjects for which objects have been already loaded,
         # including SchemaObjects of optional objects not present in database.
         self._loaded_classes = set()
+        # Loader plans of SchemaObjects, compiled on first load of their objects.
+        self._plans = {}
+        # Interned tuples of objects attributes names in assignment order, shared by
+        # all objects whose attributes are assigned in the same order.
+        self._orders = {}
+        # Names of top-level properties not loaded yet in lazy mode
+        self._lazy = set()
+        # Read-only aggregate collections and indexes computed on first access,
+        # with their objects, indexed by ids of objects and names. They are reset on
+        # load and reload, and they are not saved in DB snapshots.
+        self._collections = {}
+
+    def __getattr__(self, name):
+        # This method is called when the attribute is not found. In lazy mode, the
+        # top-level properties are loaded on first access. The instance dict is
+        # accessed directly, as this method can be called before the instance is
+        # initialized, when unpickled.
+        if name not in self.__dict__.get("_lazy", ()):
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+        self.load_lazy(name)
+        return getattr(self, name)
+
+    def __getstate__(self):
+        # The module of base classes cannot be pickled, it is replaced by its name
+        # in DB snapshots.
+        state = vars(self).copy()
+        state["_bases"] = self._bases.__name__
+        state.pop("_expanded_cache", None)
+        state.pop("_collections", None)
+        return state
+
+    def __setstate__(self, state):
+        state["_bases"] = importlib.import_module(state["_bases"])
+        vars(self).update(state)
+        self._collections = {}
+
+    def cache_expanded(self, maxsize):
+        """Memoize at most maxsize expanded objects of all expandable objects of the
+        DB, so that repeated iterations return the same instances. The cache is
+        disabled when maxsize is 0."""
+        self._expanded_cache = DBExpandedCache(maxsize) if maxsize > 0 else None
+
+    def expanded_cache_info(self):
+        """Return statistics of expanded objects cache, or None if the cache is
+        disabled."""
+        if self._expanded_cache is None:
+            return None
+        return self._expanded_cache.cache_info()
+
+    def cached(self, obj, name, build):
+        """Return the value with the given name of the given object. The value is
+        built with the given function on first access, then it is cached until the
+        DB is loaded or reloaded."""
+        key = (id(obj), name)
+        try:
+            return self._collections[key][1]
+        except KeyError:
+            result = build()
+            # The object is referenced with its value, so that its id cannot be
+            # reused by another object while the value is cached.
+            self._collections[key] = (obj, result)
+            return result
 
-    def load(self, loader):
-        obj = self.load_object("_root", loader.content, self._schema.content, None)
-        for key, value in vars(obj).items():
-            # Copy loaded object attributes to self GenericDB object, except
-            # _schema where we want to keep Schema object instead of loaded
-            # SchemaObject.
-            if key != "_schema":
-                setattr(self, key, value)
+    def collection(self, obj, name, build):
+        """Return the read-only aggregate collection with the given name of the given
+        object, built with the given function on first access and cached until the
+        DB is loaded or reloaded."""
+        return self.cached(obj, name, lambda: build().frozen())
+
+    def object_class(self, schema_object: SchemaObject, expandable=False):
+        """Return the dynamically generated class for objects of the given
+        SchemaObject, either the class of expandable objects or the class of single
+        objects, which are expanded objects for expandable SchemaObject. The class
+        inherits from the bases module class of the object when defined."""
+        if expandable:
+            bases = [DBExpandableObject]
+            classname = f"{self._prefix}Expandable{schema_object.name}"
+        elif schema_object.expandable:
+            bases = [DBExpandedObject]
+            classname = f"{self._prefix}{schema_object.name}"
+        else:
+            bases = [DBObject]
+            classname = f"{self._prefix}{schema_object.name}"
+        # Add provided module base if defined
+        try:
+            # Insert bases module class in the beginning of the list to make
+            # sure methods from this classes are called over the methods from
+            # DBObject.
+            bases.insert(
+                0,
+                getattr(self._bases, f"{self._prefix}{schema_object.name}Base"),
+            )
+        except AttributeError:
+            pass
+        if schema_object.expandable and not expandable:
+            slots = ("_expandable", "_index")
+        else:
+            slots = self._object_slots(schema_object, bases[0])
+        return dynamic_class(classname, tuple(bases), slots)
+
+    def _object_slots(self, schema_object: SchemaObject, base):
+        """Return the tuple of slots of the classes of objects of the given
+        SchemaObject."""
+        slots = ["_db", "_schema", "_parent", "_order"]
+        if schema_object.has_key():
+            slots.append("_key")
+        # Properties conflicting with attributes of the bases module class or the
+        # generic DBObject class are renamed with LOADED_PREFIX at load time. The
+        # private name of these attributes would be mangled in slots, they are
+        # stored in instances dict instead.
+        conflicts = False
+        for prop in schema_object.properties:
+            if hasattr(base, prop.name) or hasattr(DBExpandableObject, prop.name):
+                conflicts = True
+            else:
+                slots.append(prop.name)
+        if conflicts:
+            slots.append("__dict__")
+        return tuple(slots)
+
+    def load(self, loader, lazy=False):
+        """Load DB content of the given loader. In lazy mode, the top-level
+        properties are loaded on first access, with the top-level properties whose
+        objects they reference. The loader must then provide keys() and get()
+        methods to retrieve the top-level keys and their contents."""
+        self._collections.clear()
+        if not lazy:
+            obj = self.load_object("_root", loader.content, self._schema.content, None)
+            for key, value in obj._vars().items():
+                # Copy loaded object attributes to self GenericDB object, except
+                # _schema where we want to keep Schema object instead of loaded
+                # SchemaObject.
+                if key != "_schema":
+                    setattr(self, key, value)
+            # Keep the root object, parent of top-level objects, for reloads.
+            self._root = obj
+            for defined_type in self._schema.types.values():
+                logger.debug(
+                    "Defined type %s parsed values cache: %s",
+                    defined_type,
+                    defined_type.cache_info(),
+                )
+            return
+        schema_object = self._schema.content
+        plan = self.loader_plan(schema_object)
+        keys = loader.keys()
+        for token in keys:
+            if token not in plan.steps:
+                raise DBFormatError(
+                    f"Property {token} is not defined in schema for object "
+                    f"{schema_object}"
+                )
+        for step in plan.ordered:
+            if step.prop.required and step.prop.name not in keys:
+                raise DBFormatError(
+                    f"Property {step.prop.name} is required in schema for object "
+                    f"{schema_object}"
+                )
+        self._root = self.object_class(schema_object)(self, schema_object)
+        self._root._parent = None
+        self._indexes.setdefault(schema_object.name, []).append(self._root)
+        self._lazy_loader = loader
+        self._lazy = {step.prop.name for step in plan.ordered}
+
+    def load_lazy(self, name):
+        """Load the top-level property with the given name in lazy mode, after the
+        top-level properties it depends on."""
+        schema_object = self._schema.content
+        plan = self.loader_plan(schema_object)
+        step = plan.steps[name]
+        self._lazy.discard(name)
+        for other in plan.ordered:
+            if other.prop.name in self._lazy and step.depends(schema_object, other):
+                self.load_lazy(other.prop.name)
+        logger.debug("Loading DB property %s on first access", name)
+        try:
+            self._set_root_attribute(
+                step.attribute, self.load_root_property(step, self._lazy_loader)
+            )
+        except BaseException:
+            self._lazy.add(name)
+            raise
+
+    def load_lazy_objects(self, object_type_name):
+        """Load the top-level properties containing objects of the given type, when
+        not already loaded in lazy mode."""
+        plan = self.loader_plan(self._schema.content)
+        for step in plan.ordered:
+            if (
+                step.prop.name in self._lazy
+                and step.type is not None
+                and object_type_name
+                in [schema_object.name for schema_object in {step.type} | step.subobjs]
+            ):
+                self.load_lazy(step.prop.name)
+
+    def load_root_property(self, step: DBLoaderStep, loader):
+        """Return the value of the top-level property of the given plan step with
+        content of the given loader, its default value or None if not defined."""
+        if step.prop.name in loader.keys():
+            return self.load_type(
+                step.prop.name,
+                loader.get(step.prop.name),
+                step.prop.type,
+                self._root,
+            )
+        elif step.prop.required:
+            raise DBFormatError(
+                f"Property {step.prop.name} is required in schema for object "
+                f"{self._schema.content}"
+            )
+        elif step.prop.default is not None:
+            return self.load_type(
+                step.prop.name, step.prop.default, step.prop.type, self._root
+            )
+        return None
+
+    def reload(self, loader, changed):
+        """Rebuild the top-level properties whose names are in changed set with the
+        updated content of the given loader. The top-level properties with
+        references to objects of rebuilt properties are also rebuilt, so that their
+        references are resolved with the new objects. Return the set of names of
+        rebuilt properties. In case of error, the DB is restored in its previous
+        state."""
+        schema_object = self._schema.content
+        plan = self.loader_plan(schema_object)
+        for token in changed:
+            if token not in plan.steps:
+                raise DBFormatError(
+                    f"Property {token} is not defined in schema for object "
+                    f"{schema_object}"
+                )
+        steps = []
+        # Set of SchemaObjects of rebuilt properties
+        rebuilt_objects = set()
+        # Plan steps are sorted after their references, dependent properties are
+        # then found in a single pass.
+        for step in plan.ordered:
+            # Properties not loaded yet in lazy mode are loaded with the updated
+            # content on first access.
+            if step.prop.name in self._lazy:
+                continue
+            if step.prop.name not in changed and step.refs.isdisjoint(rebuilt_objects):
+                continue
+            steps.append(step)
+            if step.type is not None:
+                rebuilt_objects |= {step.type} | step.subobjs
+        # Save indexes and rebuilt properties values to restore them on error.
+        indexes = {name: objects.copy() for name, objects in self._indexes.items()}
+        keys = {name: objects.copy() for name, objects in self._keys.items()}
+        values = {
+            step.attribute: getattr(self._root, step.attribute)
+            for step in steps
+            if hasattr(self._root, step.attribute)
+        }
+        # Memoized expanded objects of rebuilt properties would keep the replaced
+        # expandable objects alive.
+        if self._expanded_cache is not None:
+            self._expanded_cache.clear()
+        # Aggregate collections are built again with the rebuilt objects.
+        self._collections.clear()
+        try:
+            for step in steps:
+                logger.debug("Rebuilding DB property %s", step.prop.name)
+                self.unload_property(step)
+                self._set_root_attribute(
+                    step.attribute, self.load_root_property(step, loader)
+                )
+        except BaseException:
+            self._indexes = indexes
+            self._keys = keys
+            for step in steps:
+                self._set_root_attribute(step.attribute, values.get(step.attribute))
+            raise
+        return {step.prop.name for step in steps}
+
+    def _set_root_attribute(self, attribute, value):
+        """Set attribute value on root object and self, or remove the attribute if
+        value is None."""
+        for obj in self._root, self:
+            if value is not None:
+                setattr(obj, attribute, value)
+            elif hasattr(obj, attribute):
+                delattr(obj, attribute)
+
+    def unload_property(self, step: DBLoaderStep):
+        """Remove the objects of the given top-level property step from DB
+        indexes."""
+        if step.type is None:
+            return
+        removed = set()  # ids of removed objects
+        self.collect_objects(
+            getattr(self._root, step.attribute, None), step.prop.type, removed
+        )
+        for schema_object in {step.type} | step.subobjs:
+            if schema_object.name in self._indexes:
+                self._indexes[schema_object.name] = [
+                    obj
+                    for obj in self._indexes[schema_object.name]
+                    if id(obj) not in removed
+                ]
+            for name in self._indexed.get(schema_object.name, ()):
+                keys = self._keys.get((schema_object.name, name), {})
+                for key, obj in list(keys.items()):
+                    if isinstance(obj, DBExpandedObject):
+                        obj = obj._expandable
+                    if id(obj) in removed:
+                        del keys[key]
+
+    def collect_objects(self, value, schema_type: SchemaGenericValueType, result):
+        """Add ids of objects contained in value of the given schema type to result
+        set, recursively."""
+        if isinstance(schema_type, SchemaContainerList):
+            if isinstance(value, DBDict):
+                items = value.values()
+            elif isinstance(value, DBList):
+                items = value.itervalues()
+            else:
+                return
+            for item in items:
+                self.collect_objects(item, schema_type.content, result)
+        elif isinstance(schema_type, SchemaObject) and isinstance(value, DBObject):
+            result.add(id(value))
+            attributes = value._vars()
+            for prop in schema_type.properties:
+                value = attributes.get(
+                    prop.name, attributes.get(DBObject.LOADED_PREFIX + prop.name)
+                )
+                if value is not None:
+                    self.collect_objects(value, prop.type, result)
 
     def load_type(
         self,
@@ -304,13 +1560,13 @@ class GenericDB(DBObject):
             return self.load_defined_type(literal, schema_type)
         elif isinstance(schema_type, SchemaExpandable):
             if not isinstance(literal, str):
-                DBFormatError(
+                raise DBFormatError(
                     f"token {token} of {schema_type} is not a valid expandable str"
                 )
             return self.load_expandable(literal)
         elif isinstance(schema_type, SchemaRangeId):
             if not isinstance(literal, int):
-                DBFormatError(
+                raise DBFormatError(
                     f"token {token} of {schema_type} is not a valid rangeid integer"
                 )
             return self.load_rangeid(literal)
@@ -330,37 +1586,22 @@ class GenericDB(DBObject):
         )
 
     def load_defined_type(self, literal, schema_type: SchemaDefinedType):
-        return schema_type.parse(literal)
+        return schema_type.load(literal)
 
     def load_object(
         self, token, literal, schema_object: SchemaObject, parent: SchemaObject
     ):
         logger.debug("Loading object %s with %s (%s)", token, literal, schema_object)
-        # is it expandable?
-        if schema_object.expandable:
-            bases = [DBExpandableObject]
-            classname = f"{self._prefix}Expandable{schema_object.name}"
-        else:
-            bases = [DBObject]
-            classname = f"{self._prefix}{schema_object.name}"
-        # Add provided module base if defined
-        try:
-            # Insert bases module class in the beginning of the list to make
-            # sure methods from this classes are called over the methods from
-            # DBObject.
-            bases.insert(
-                0,
-                getattr(self._bases, f"{self._prefix}{schema_object.name}Base"),
-            )
-        except AttributeError:
-            pass
         # instanciate the object with its dynamically defined class
-        obj = type(classname, tuple(bases), dict())(self, schema_object)
+        obj = self.object_class(schema_object, schema_object.expandable)(
+            self, schema_object
+        )
 
         obj._parent = parent
 
-        # load object attributes
-        self.load_object_attributes(obj, literal, schema_object)
+        # load object attributes, and record the order of assigned attributes
+        order = ["_db", "_schema", "_parent"]
+        order.extend(self.load_object_attributes(obj, literal, schema_object))
 
         for prop in schema_object.properties:
             # Check all required properties are properly defined in obj
@@ -377,6 +1618,7 @@ class GenericDB(DBObject):
             # Load back references
             if isinstance(prop.type, SchemaBackReference):
                 setattr(obj, prop.name, self.load_back_reference(obj, prop.type))
+                order.append(prop.name)
             # Assign default value to optional properties when provided in
             # schema.
             if not hasattr(obj, prop.name) and prop.default is not None:
@@ -388,21 +1630,14 @@ class GenericDB(DBObject):
                     value,
                 )
                 setattr(obj, prop.name, value)
-            # If property is a key, check value uniqueness and set object _key
-            # attribute.
+                order.append(prop.name)
+            # If property is a key, set object _key attribute.
             if prop.key:
-                value = getattr(obj, prop.name)
-                # If another object of the same type is already present in index
-                if schema_object.name in self._indexes:
-                    # Check over all previously loaded objects of the same type
-                    # if this key value has not been used yet.
-                    for _obj in self._indexes[schema_object.name]:
-                        if getattr(_obj, prop.name) == value:
-                            raise DBFormatError(
-                                f"Key value {value} of {schema_object} is not "
-                                "unique."
-                            )
-                setattr(obj, "_key", value)
+                setattr(obj, "_key", getattr(obj, prop.name))
+                order.append("_key")
+        order = tuple(order)
+        obj._order = self._orders.setdefault(order, order)
+        self.index_object(obj, schema_object)
 
         # add object to db indexes
         if schema_object.name not in self._indexes:
@@ -412,42 +1647,89 @@ class GenericDB(DBObject):
         logger.debug("Loaded classes: %s", [cls.name for cls in self._loaded_classes])
         return obj
 
+    def index_object(self, obj, schema_object: SchemaObject):
+        """Add the given object in the key indexes of its indexed properties. The
+        uniqueness of key properties values is checked, the first object is kept for
+        other properties values."""
+        for name in self._indexed.get(schema_object.name, ()):
+            value = getattr(obj, name, None)
+            if value is None:
+                continue
+            if isinstance(value, DBObjectRange):
+                entries = [(key, obj) for key in value]
+            elif isinstance(obj, DBExpandableObject):
+                # The value may be a rangeid or a value shared by all expanded
+                # objects.
+                entries = [
+                    (getattr(expanded, name), expanded) for expanded in obj.objects()
+                ]
+            else:
+                entries = [(value, obj)]
+            keys = self._keys.setdefault((schema_object.name, name), {})
+            if schema_object.prop(name).key:
+                for key, _ in entries:
+                    if key in keys:
+                        raise DBFormatError(
+                            f"Key value {key} of {schema_object} is not unique."
+                        )
+            for key, target in entries:
+                try:
+                    keys.setdefault(key, target)
+                except TypeError:
+                    # unhashable values cannot be referenced
+                    pass
+
+    def loader_plan(self, schema_object: SchemaObject) -> DBLoaderPlan:
+        """Return the loader plan of the given SchemaObject."""
+        try:
+            return self._plans[schema_object]
+        except KeyError:
+            return self._plans.setdefault(schema_object, DBLoaderPlan(schema_object))
+
     def load_object_attributes(self, obj, content, schema_object: SchemaObject):
+        """Load the attributes of the given object with the given content and return
+        the list of names of assigned attributes, in the order of the content for the
+        attributes loaded in the same pass."""
+        plan = self.loader_plan(schema_object)
+
+        # Check all attributes are defined in schema
+        for token in content:
+            if token not in plan.steps:
+                raise DBFormatError(
+                    f"Property {token} is not defined in schema for object "
+                    f"{schema_object}"
+                )
 
-        _content = content.copy()
+        steps = [step for step in plan.ordered if step.prop.name in content]
         passes = 0
+        # Pass number and name of assigned attribute, indexed by property name
+        assigned = {}
 
-        while len(_content):
+        while len(steps):
             # Pass number
             passes += 1
-            # Flag to know if at least one attribute has been loaded in last
-            # pass.
-            processed = False
-
-            # Iterate over a copy of last pass remaining object attributes
-            for token, literal in _content.copy().items():
-                # Get the schema property corresponding to this token
-                token_property = self.token_object_property(token, schema_object)
+            # List of steps that cannot be run in this pass, to retry in the
+            # next pass.
+            deferred = []
+
+            for step in steps:
                 # Check if this attribute can be loaded, considering its
                 # references and loaded objects.
-                if not self.loadable_attribute(token, token_property, passes, obj):
+                if not self.loadable_attribute(step, passes, obj):
                     # The attribute cannot be loaded, jump to next attribute.
                     logger.debug(
                         "Skipping object %s property %s in pass %d",
                         schema_object.name,
-                        token,
+                        step.prop.name,
                         passes,
                     )
+                    deferred.append(step)
                     continue
-                else:
-                    # The attribute can be loaded, set the flag and remove the
-                    # attribute from the dict for the next pass.
-                    processed = True
-                    del _content[token]
-
-                attribute = self.load_type(token, literal, token_property.type, obj)
-                if token.endswith("[]"):
-                    token = token[:-2]
+
+                attribute = self.load_type(
+                    step.prop.name, content[step.prop.name], step.prop.type, obj
+                )
+                token = step.attribute
                 # Check the bases module class does not already provide a
                 # conflicting attribute with the same name. In this case, it is
                 # renamed with LOADED_PREFIX.
@@ -460,81 +1742,66 @@ class GenericDB(DBObject):
                     )
                     token = obj.LOADED_PREFIX + token
                 setattr(obj, token, attribute)
+                assigned[step.prop.name] = (passes, token)
             # Check if at least one attribute has been loaded during this pass,
             # or raise DB format error exception.
-            if not processed:
+            if len(deferred) == len(steps):
                 raise DBFormatError(
-                    f"Unable to load {token} {schema_object.name} after "
-                    f"{passes} passes, probably because of circular references"
+                    f"Unable to load {deferred[-1].prop.name} {schema_object.name} "
+                    f"after {passes} passes, probably because of circular references"
                 )
-
-    def token_object_property(
-        self, token, schema_object: SchemaObject
-    ) -> SchemaProperty:
-        token_property = schema_object.prop(token)
-        if token_property is None:
-            raise DBFormatError(
-                f"Property {token} is not defined in schema for object "
-                f"{schema_object}"
-            )
-        return token_property
-
-    def loadable_attribute(self, token, token_property, passes, obj):
-        subtype = token_property.type
-        # If the property is a list, check the content of the list.
-        if isinstance(token_property.type, SchemaContainerList):
-            subtype = token_property.type.content
-        if isinstance(subtype, SchemaObject):
-            # If one object reference is not defined in inspected object
-            # sub-objects and not available in set of already loaded objects,
-            # the attribute cannot be loaded (yet).
-            for ref in subtype.refs - subtype.subobjs:
-                if ref not in self._loaded_classes:
-                    logger.debug(
-                        "Found undefined reference to %s in property %s in pass %d",
-                        ref.name,
-                        token,
-                        passes,
-                    )
-                    return False
-            # Check back references with properties are all loaded. If one back
-            # reference with a property points to a property not already loaded
-            # on back referenced object, the attribute cannot be loaded (yet).
-            for prop in subtype.properties:
-                if (
-                    isinstance(prop.type, SchemaBackReference)
-                    and prop.type.prop is not None
-                ):
-                    # Loop to find the back referenced object
-                    while obj._schema is not prop.type.obj and obj is not None:
-                        obj = obj._parent
-                    # Check attribute is already defined on referenced object
-                    if not hasattr(obj, prop.type.prop):
-                        logger.debug(
-                            "Found undefined back reference to %s.%s in "
-                            "property %s in pass %d",
-                            ref.name,
-                            prop.type.prop,
-                            token,
-                            passes,
-                        )
-                        return False
+            steps = deferred
+        return [
+            assigned[token][1]
+            for token in sorted(content, key=lambda token: assigned[token][0])
+        ]
+
+    def loadable_attribute(self, step: DBLoaderStep, passes, obj):
+        # If one object reference is not defined in inspected object sub-objects
+        # and not available in set of already loaded objects, the attribute cannot
+        # be loaded (yet).
+        for ref in step.refs:
+            if ref not in self._loaded_classes:
+                logger.debug(
+                    "Found undefined reference to %s in property %s in pass %d",
+                    ref.name,
+                    step.prop.name,
+                    passes,
+                )
+                return False
+        # Check back references with properties are all loaded. If one back
+        # reference with a property points to a property not already loaded on back
+        # referenced object, the attribute cannot be loaded (yet).
+        for back_reference in step.back_references:
+            # Loop to find the back referenced object
+            parent = obj
+            while parent is not None and parent._schema is not back_reference.obj:
+                parent = parent._parent
+            # Check attribute is already defined on referenced object
+            if not hasattr(parent, back_reference.prop):
+                logger.debug(
+                    "Found undefined back reference to %s.%s in property %s in "
+                    "pass %d",
+                    back_reference.obj.name,
+                    back_reference.prop,
+                    step.prop.name,
+                    passes,
+                )
+                return False
         return True
 
     def load_reference(self, token, literal, schema_type: SchemaReference):
-        all_objs = self.find_objects(schema_type.obj.name, expand=True)
-        if all_objs is None:
+        if schema_type.obj.name not in self._indexes:
             raise DBFormatError(
                 f"Unable to find {token} {literal} reference because objects "
                 f"{schema_type.obj.name} are missing in DB indexes"
             )
-
-        logger.debug("Found objects for type %s: %s", schema_type.obj.name, all_objs)
-        for _obj in all_objs:
-            property_value = getattr(_obj, schema_type.prop)
-            if property_value == literal:
-                return _obj
-        raise DBFormatError(f"Unable to find {token} reference with value {literal}")
+        result = self._find_indexed(schema_type.obj.name, schema_type.prop, literal)
+        if result is None:
+            raise DBFormatError(
+                f"Unable to find {token} reference with value {literal}"
+            )
+        return result
 
     def load_back_reference(self, parent, schema_type: SchemaBackReference):
         logger.debug("Loading back reference of %s/%s", parent, schema_type)
@@ -592,12 +1859,40 @@ class GenericDB(DBObject):
             return result
 
     def load_expandable(self, literal):
-        return type(f"{self._prefix}ExpandableRange", (DBObjectRange,), dict())(literal)
+        return dynamic_class(f"{self._prefix}ExpandableRange", (DBObjectRange,))(
+            literal
+        )
 
     def load_rangeid(self, literal):
-        return type(f"{self._prefix}RangeId", (DBObjectRangeId,), dict())(literal)
+        return dynamic_class(f"{self._prefix}RangeId", (DBObjectRangeId,))(literal)
+
+    def find_object(self, object_type_name, key, prop=None):
+        """Return the object of the given type with the given value of its key
+        property, or of the given property when provided, or None if not found. The
+        property must be a key property or a property targeted by references. The
+        expanded object is returned for expanded keys of expandable objects."""
+        self.load_lazy_objects(object_type_name)
+        if prop is None:
+            schema_object = self._schema.objects.get(object_type_name)
+            if schema_object is None or not schema_object.has_key():
+                return None
+            prop = schema_object.key_property()
+        return self._find_indexed(object_type_name, prop, key)
+
+    def _find_indexed(self, object_type_name, prop, value):
+        """Return the object of the given type with the given value in the key index
+        of the given property, or None if not found."""
+        try:
+            result = self._keys.get((object_type_name, prop), {}).get(value)
+        except TypeError:
+            # unhashable values are not indexed
+            return None
+        if isinstance(result, DBExpandableObject):
+            return result.getobject(value)
+        return result
 
     def find_objects(self, object_type_name, expand=False):
+        self.load_lazy_objects(object_type_name)
         if object_type_name not in self._indexes:
             return None
         result = []
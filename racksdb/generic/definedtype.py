@@ -5,20 +5,64 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import re
+from collections import namedtuple
 
 from .errors import DBFormatError
 
+SchemaDefinedTypeCacheInfo = namedtuple(
+    "SchemaDefinedTypeCacheInfo", ["hits", "misses", "size", "maxsize"]
+)
+
 
 class SchemaDefinedType:
+
+    # Maximum number of parsed values memoized by defined types
+    CACHE_SIZE = 1024
+
     def __init__(self):
         self.name = self.__class__.__module__
+        # Memoized parsed values, indexed by types and literals values
+        self._cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Compile the regular expression once per defined type class.
+        if "pattern" in cls.__dict__:
+            cls._regex = re.compile(cls.pattern)
 
     def __str__(self):
         return f"~{self.name}"
 
     def _match(self, value):
-        regex = re.compile(self.pattern)
-        match = regex.match(str(value))
+        match = self._regex.match(str(value))
         if match is None:
             raise DBFormatError(f"Unable to match {self} pattern with value {value}")
         return match
+
+    def load(self, value):
+        """Return the parsed value of the given literal, memoized in a bounded cache
+        as the same literals are usually repeated many times in DB. When the cache
+        is full, the oldest values are evicted."""
+        key = (type(value), value)
+        try:
+            result = self._cache[key]
+        except KeyError:
+            self.misses += 1
+            result = self.parse(value)
+            if len(self._cache) >= self.CACHE_SIZE:
+                del self._cache[next(iter(self._cache))]
+            self._cache[key] = result
+            return result
+        except TypeError:
+            # Unhashable literal cannot be memoized
+            return self.parse(value)
+        self.hits += 1
+        return result
+
+    def cache_info(self):
+        """Return statistics of parsed values cache."""
+        return SchemaDefinedTypeCacheInfo(
+            self.hits, self.misses, len(self._cache), self.CACHE_SIZE
+        )
@@ -57,7 +57,7 @@ class GenericJSONEncoder(json.JSONEncoder, MapperDumper):
                 return obj
         elif isinstance(obj, DBObject):
             result = {}
-            for attribute, value in vars(obj).items():
+            for attribute, value in obj._vars().items():
                 # Skip special attributes
                 if attribute in [
                     "_db",
@@ -63,7 +63,7 @@ class DBDumperYAML(MapperDumper):
 
         node = yaml.MappingNode(tag, node_value)
 
-        for item_key, item_value in vars(data).items():
+        for item_key, item_value in data._vars().items():
             # skip special fields
             if item_key in [
                 "_db",
@@ -94,8 +94,8 @@ class DBDumperYAML(MapperDumper):
         return dumper.represent_data(data.start)
 
     def _setup(self):
-        yaml.add_representer(DBDict, self._represent_dict)
-        yaml.add_representer(DBList, self._represent_list)
+        yaml.add_multi_representer(DBDict, self._represent_dict)
+        yaml.add_multi_representer(DBList, self._represent_list)
         yaml.add_multi_representer(DBObject, self._represent_dbobject)
         yaml.add_multi_representer(DBObjectRange, self._represent_dbobjectrange)
         yaml.add_multi_representer(DBObjectRangeId, self._represent_dbobjectrangeid)
@@ -0,0 +1,23 @@
+# Copyright (c) 2023 Rackslab
+#
+# This file is part of RacksDB.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import yaml
+
+# Use the fast libyaml C parser when PyYAML is built against libyaml, or fallback to
+# the pure-Python parser.
+try:
+    from yaml import CSafeLoader as SafeLoader
+
+    YAML_BACKEND = "libyaml"
+except ImportError:
+    from yaml import SafeLoader
+
+    YAML_BACKEND = "python"
+
+
+def yaml_load(stream):
+    """Parse YAML stream with the safe loader of the available backend."""
+    return yaml.load(stream, Loader=SafeLoader)
@@ -11,6 +11,7 @@ import yaml
 import logging
 
 from .errors import DBSchemaError
+from .parser import yaml_load, YAML_BACKEND
 
 logger = logging.getLogger(__name__)
 
@@ -43,9 +44,12 @@ class SchemaFileLoader:
     def content(self):
         if not self.path.exists():
             raise DBSchemaError(f"Schema path {self.path} does not exist")
+        logger.debug(
+            "Loading schema file %s with %s YAML parser", self.path, YAML_BACKEND
+        )
         with open(self.path) as fh:
             try:
-                result = yaml.safe_load(fh)
+                result = yaml_load(fh)
             except yaml.composer.ComposerError as err:
                 raise DBSchemaError(err)
         # load schema extensions
@@ -63,7 +67,7 @@ class SchemaFileLoader:
         logger.debug("Loading schema extensions file %s", self.extensions)
         with open(self.extensions) as fh:
             try:
-                extensions = yaml.safe_load(fh)
+                extensions = yaml_load(fh)
             except yaml.composer.ComposerError as err:
                 raise DBSchemaError(err)
         if "_content" in extensions:
@@ -107,6 +111,8 @@ class SchemaObject(SchemaGenericValueType):
         self.name = name
         self.description = description
         self.properties = []  # list of SchemaProperty
+        # Dict of SchemaProperty indexed by their names
+        self._properties = {}
         self.expandable = False
         # Set of SchemaObject attached to this object properties, recursively.
         self.subobjs = set()
@@ -119,11 +125,13 @@ class SchemaObject(SchemaGenericValueType):
         else:
             return f"Schema{self.name}"
 
+    def add_prop(self, prop):
+        """Add SchemaProperty to the object properties."""
+        self.properties.append(prop)
+        self._properties[prop.name] = prop
+
     def prop(self, name):
-        for _prop in self.properties:
-            if _prop.name == name:
-                return _prop
-        return None
+        return self._properties.get(name)
 
     def has_key(self):
         """Return True if the object has a key property or False otherwise."""
@@ -339,7 +347,7 @@ class Schema:
             if isinstance(subtype, SchemaObject):
                 obj.refs |= subtype.refs
                 obj.subobjs |= {subtype} | subtype.subobjs
-            obj.properties.append(prop)
+            obj.add_prop(prop)
         logger.debug(
             "Class %s refs: %s subobjs: %s",
             object_id,
@@ -0,0 +1,120 @@
+# Copyright (c) 2023 Rackslab
+#
+# This file is part of RacksDB.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import functools
+import hashlib
+import logging
+import os
+from pathlib import Path
+import pickle
+import sys
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def code_digest():
+    """Return the digest of RacksDB package source code, computed once per process.
+    It is included in cache fingerprints, so that cached data are invalidated when
+    RacksDB is upgraded or its code is modified."""
+    package = Path(__file__).resolve().parents[1]
+    digest = hashlib.sha256()
+    for path in sorted(package.rglob("*.py")):
+        relative = path.relative_to(package)
+        if relative.parts[0] == "tests":
+            continue
+        digest.update(str(relative).encode())
+        digest.update(b"\0")
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+class DBSnapshot:
+    """Binary snapshot of a loaded database in cache directory. Snapshots are keyed on
+    the paths, the modification times and the sizes of all the source files (ie.
+    schema, extensions and database files) and on RacksDB code. When any of these
+    files is modified, added or removed, or when RacksDB is upgraded, the snapshot is
+    considered outdated and it is ignored."""
+
+    # Version of snapshots format, to be bumped when internal representation of
+    # loaded objects is modified in order to invalidate existing snapshots.
+    FORMAT = 10
+
+    def __init__(self, cache, sources):
+        self.sources = sources
+        # Snapshot file name is a digest of the sources paths, so that different
+        # databases do not share the same snapshot file.
+        digest = hashlib.sha256(
+            "\0".join([str(source.resolve()) for source in sources]).encode()
+        ).hexdigest()
+        self.path = cache.joinpath(f"{digest}.snapshot")
+        # The fingerprint is computed before the sources are actually loaded, so
+        # that modifications during load are detected on next snapshot load.
+        self.fingerprint = self._fingerprint()
+
+    def _fingerprint(self):
+        stats = [self.FORMAT, tuple(sys.version_info[:2]), code_digest()]
+        for source in self.sources:
+            stats.extend(self._source_stats(source))
+        return hashlib.sha256(repr(stats).encode()).hexdigest()
+
+    def _source_stats(self, path):
+        if not path.exists():
+            return [(str(path), None)]
+        if path.is_file():
+            stat = path.stat()
+            return [(str(path), stat.st_mtime_ns, stat.st_size)]
+        result = []
+        for item in sorted(path.iterdir()):
+            result.extend(self._source_stats(item))
+        return result
+
+    def load(self, cls):
+        """Return the database object restored from snapshot, or None if snapshot is
+        not found, outdated or invalid."""
+        if not self.path.exists():
+            logger.debug("DB snapshot %s not found", self.path)
+            return None
+        try:
+            with open(self.path, "rb") as fh:
+                if pickle.load(fh) != self.fingerprint:
+                    logger.debug("DB snapshot %s is outdated, ignoring", self.path)
+                    return None
+                result = pickle.load(fh)
+        # Snapshot can be truncated, corrupted or generated by an incompatible
+        # version of RacksDB, in which case the database is loaded from sources.
+        except Exception as err:
+            logger.warning("Unable to load DB snapshot %s: %s", self.path, err)
+            return None
+        if not isinstance(result, cls):
+            logger.warning(
+                "DB snapshot %s does not contain %s object", self.path, cls.__name__
+            )
+            return None
+        logger.debug("Loaded DB from snapshot %s", self.path)
+        return result
+
+    def save(self, db):
+        """Save database object in snapshot. Errors are reported but they are not
+        fatal, the database is loaded from sources next time."""
+        try:
+            self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            # Write snapshot in temporary file, then rename it atomically to make
+            # sure concurrent loads never read partial snapshots.
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    pickle.dump(self.fingerprint, fh)
+                    pickle.dump(db, fh, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except (OSError, pickle.PicklingError, RecursionError) as err:
+            logger.warning("Unable to save DB snapshot %s: %s", self.path, err)
+            return
+        logger.debug("Saved DB snapshot %s", self.path)
@@ -0,0 +1,672 @@
+# Copyright (c) 2023 Rackslab
+#
+# This file is part of RacksDB.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import concurrent.futures
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import tempfile
+
+from ClusterShell.NodeSet import NodeSet, NodeSetParseError, RangeSetParseError
+
+from .errors import DBFormatError
+from .definedtype import SchemaDefinedType
+from .db import DBFileLoader
+from .snapshot import code_digest
+from .schema import (
+    SchemaNativeType,
+    SchemaContainerList,
+    SchemaExpandable,
+    SchemaRangeId,
+    SchemaObject,
+    SchemaReference,
+    SchemaBackReference,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DBReferenceTargets:
+    """Values of one property of all objects of a type, used to check references
+    targets. Ranges of expandable objects are kept folded in NodeSet and ranges of
+    integers, they are not expanded."""
+
+    def __init__(self):
+        self.values = set()
+        self.nodesets = []
+        self.intranges = []
+
+    def __contains__(self, value):
+        try:
+            if value in self.values:
+                return True
+        except TypeError:
+            # unhashable value
+            return False
+        if isinstance(value, str):
+            try:
+                node = NodeSet(value)
+            except (NodeSetParseError, RangeSetParseError):
+                # value is not a valid node name, it cannot be in ranges
+                return False
+            # References target single objects, folded values are not resolved by
+            # the loader.
+            if len(node) != 1 or str(node) != value:
+                return False
+            return any(value in nodeset for nodeset in self.nodesets)
+        if isinstance(value, int):
+            return any(start <= value < end for start, end in self.intranges)
+        return False
+
+
+class DBValidationRecord:
+    """Validation results of a DB file, or of the DB content outside of files, that
+    can be stored in validation cache and replayed when the file is not modified."""
+
+    def __init__(self, path=None, stats=None, digest=None, context=None):
+        self.path = path
+        # Modification time, size and digest of file content
+        self.stats = stats
+        self.digest = digest
+        # Location of the file in DB content, used to detect file moves
+        self.context = context
+        # Errors found in file and keys provided by the file objects, in walk
+        # order, as ("error", message) and ("key", location, object name, object
+        # label, value) tuples.
+        self.events = []
+        # Values of properties targeted by references provided by the file
+        # objects, as (object name, property name, value, size) tuples.
+        self.targets = []
+        # References consumed by the file objects, as (location, token, literal,
+        # object name, property name) tuples.
+        self.references = []
+        # Errors of references that could not be resolved
+        self.unresolved = []
+        # Names of objects types that could not be parsed in file
+        self.unparsed = set()
+
+    def consumes(self, pairs, objects):
+        """Return True if the file consumes references to the given (object name,
+        property name) pairs or to the given objects names."""
+        return any(
+            (reference[3], reference[4]) in pairs or reference[3] in objects
+            for reference in self.references
+        )
+
+    def provides(self):
+        """Return the set of (object name, property name) pairs provided by the
+        file."""
+        return {(target[0], target[1]) for target in self.targets}
+
+
+class DBValidationFile:
+    """Placeholder of DB file content in DB content assembled for validation. The
+    file is parsed only when its cached validation record cannot be replayed."""
+
+    def __init__(self, path, record=None, loader=None, error=None):
+        self.path = path
+        # Cached DBValidationRecord whose digest matches the file content
+        self.record = record
+        self.loader = loader
+        self.error = error
+        # Key property and key value injected in file content when the file is
+        # an item of a dictionnary of objects.
+        self.key = None
+
+    def keyed(self, key_property, key):
+        result = DBValidationFile(self.path, self.record, self.loader, self.error)
+        result.key = (key_property, key)
+        return result
+
+    def load(self):
+        if self.loader is None and self.error is None:
+            logger.debug("Parsing DB file %s for validation", self.path)
+            try:
+                self.loader = DBFileLoader(self.path)
+            except DBFormatError as err:
+                self.error = err
+
+
+class DBValidationCache:
+    """Validation records of DB files in cache directory. The cache is keyed on
+    the path of the database and it is invalidated when the schema, its extensions
+    or RacksDB code are modified."""
+
+    # Version of cache format, to be bumped when validation records are modified.
+    FORMAT = 1
+
+    def __init__(self, cache, db, sources):
+        digest = hashlib.sha256(str(db.resolve()).encode()).hexdigest()
+        self.path = cache.joinpath(f"{digest}.validation")
+        fingerprint = hashlib.sha256()
+        fingerprint.update(
+            repr([self.FORMAT, tuple(sys.version_info[:2]), code_digest()]).encode()
+        )
+        for source in sources:
+            if source.is_file():
+                fingerprint.update(source.read_bytes())
+            fingerprint.update(b"\0")
+        self.fingerprint = fingerprint.hexdigest()
+        # DBValidationRecord indexed by files paths, with None for the DB content
+        # outside of files.
+        self.records = {}
+        # Names of objects types that could not be parsed in DB
+        self.unparsed = set()
+
+    def load(self):
+        """Load validation records from cache. The records are ignored if the cache
+        is not found, outdated or invalid."""
+        if not self.path.exists():
+            logger.debug("DB validation cache %s not found", self.path)
+            return
+        try:
+            with open(self.path, "rb") as fh:
+                if pickle.load(fh) != self.fingerprint:
+                    logger.debug(
+                        "DB validation cache %s is outdated, ignoring", self.path
+                    )
+                    return
+                self.records, self.unparsed = pickle.load(fh)
+        except Exception as err:
+            logger.warning("Unable to load DB validation cache %s: %s", self.path, err)
+            self.records, self.unparsed = {}, set()
+            return
+        logger.debug(
+            "Loaded %d records from DB validation cache %s",
+            len(self.records),
+            self.path,
+        )
+
+    def save(self, records, unparsed):
+        """Save validation records in cache. Errors are reported but they are not
+        fatal."""
+        try:
+            self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    pickle.dump(self.fingerprint, fh)
+                    pickle.dump(
+                        (records, unparsed), fh, protocol=pickle.HIGHEST_PROTOCOL
+                    )
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except (OSError, pickle.PicklingError) as err:
+            logger.warning("Unable to save DB validation cache %s: %s", self.path, err)
+            return
+        logger.debug("Saved DB validation cache %s", self.path)
+
+
+class DBValidator:
+    """Validate DB content against schema without instanciating DB objects. All the
+    errors found in DB are reported.
+
+    The content is walked in a first pass to check types, required properties,
+    keys uniqueness and back references, and to collect the values of all properties
+    targeted by references in schema. The references are checked in a second pass
+    with these collected values.
+
+    With a validation cache, the results are recorded per DB file. The files not
+    modified since last validation are not parsed, their recorded results are
+    replayed, and their references are checked again only when the values they
+    target are modified."""
+
+    def __init__(self, schema):
+        self.schema = schema
+        # Set of (object name, property name) targeted by references in schema
+        self.targets = set()
+        for schema_object in [schema.content] + list(schema.objects.values()):
+            for prop in schema_object.properties:
+                if isinstance(prop.type, SchemaReference):
+                    self.targets.add((prop.type.obj.name, prop.type.prop))
+                elif isinstance(prop.type, SchemaContainerList) and isinstance(
+                    prop.type.content, SchemaReference
+                ):
+                    self.targets.add(
+                        (prop.type.content.obj.name, prop.type.content.prop)
+                    )
+
+    def validate(self, loader, cache=None):
+        """Return the list of errors found in DB content of the given loader.
+
+        Without cache, the loader must provide keys() and get() methods to retrieve
+        the top-level keys and their contents, so that parsing errors of every
+        top-level keys are reported. With a DBValidationCache, the loader must be a
+        DBSplittedFilesLoader and the cache is updated with the results of the
+        validation."""
+        self.errors = []
+        # Scalar keys values and NodeSet of expandable keys, indexed by object name
+        self.keys = {}
+        self.ranges = {}
+        # DBReferenceTargets indexed by (object name, property name)
+        self.values = {}
+        # DBValidationRecord of DB content outside of files, and of all files in
+        # walk order.
+        self.record = DBValidationRecord()
+        self.records = [self.record]
+        # Paths of files whose cached records are replayed
+        self.replayed = set()
+
+        if cache is None:
+            self._validate_keys(loader)
+            self._validate_references(set(), set())
+        else:
+            self._validate_files(loader, cache)
+        logger.debug("Found %d errors in DB", len(self.errors))
+        return self.errors
+
+    def _validate_keys(self, loader):
+        try:
+            keys = loader.keys()
+        except DBFormatError as err:
+            # The DB is defined in a single file which cannot be parsed.
+            self._error("", err)
+            return
+        content = {}
+        for key in keys:
+            try:
+                content[key] = loader.get(key)
+            except DBFormatError as err:
+                self._error(key, err)
+                prop = self.schema.content.prop(key)
+                if prop is not None:
+                    self.record.unparsed.update(self._objects(prop.type))
+        # Top-level keys with parsing errors are not considered missing.
+        self._validate_object(
+            "", content, self.schema.content, [], ignored=set(keys) - set(content)
+        )
+
+    def _validate_files(self, loader, cache):
+        cache.load()
+        files = {}
+        # Files modified since their last validation, they are all parsed
+        # upfront so they can be parsed in parallel.
+        modified = []
+        for path in loader.paths():
+            record = cache.records.get(path)
+            if record is not None:
+                stat = path.stat()
+                if record.stats == (stat.st_mtime_ns, stat.st_size):
+                    files[path] = DBValidationFile(path, record)
+                    continue
+            modified.append(path)
+        for path, (_loader, error) in self._load_files(modified, loader.workers):
+            record = cache.records.get(path)
+            if _loader is not None and record is not None:
+                if record.digest == _loader.digest:
+                    # Only the file modification time has changed.
+                    record.stats = _loader.stats
+                else:
+                    record = None
+            files[path] = DBValidationFile(path, record, _loader, error)
+
+        self._validate_type("", "", loader.assemble(files), self.schema.content, [])
+
+        # Pairs of (object name, property name) whose targets values may have been
+        # modified, added or removed since last validation.
+        pairs = set()
+        records = {record.path: record for record in self.records}
+        for path, record in records.items():
+            if path in self.replayed:
+                continue
+            previous = cache.records.get(path)
+            if previous is None or previous.targets != record.targets:
+                pairs |= record.provides()
+                if previous is not None:
+                    pairs |= previous.provides()
+        for path, record in cache.records.items():
+            if path not in records:
+                pairs |= record.provides()
+        self._validate_references(pairs, cache.unparsed | self._unparsed())
+        logger.debug(
+            "Validated %d DB files, %d replayed from cache",
+            len(self.records) - 1,
+            len(self.replayed),
+        )
+        cache.save(records, self._unparsed())
+
+    def _load_files(self, paths, workers):
+        """Return list of (path, (DBFileLoader, DBFormatError)) of the given paths,
+        with either DBFileLoader or DBFormatError set to None."""
+
+        def load(path):
+            logger.debug("Parsing DB file %s for validation", path)
+            try:
+                return (DBFileLoader(path), None)
+            except DBFormatError as err:
+                return (None, err)
+
+        if workers > 1 and len(paths) > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(zip(paths, executor.map(load, paths)))
+        return [(path, load(path)) for path in paths]
+
+    def _unparsed(self):
+        """Return the set of names of objects types that could not be parsed."""
+        result = set()
+        for record in self.records:
+            result |= record.unparsed
+        return result
+
+    def _validate_references(self, pairs, objects):
+        unparsed = self._unparsed()
+        for record in self.records:
+            # The references of replayed records are resolved again only when
+            # their targets may have changed.
+            if record.path not in self.replayed or record.consumes(pairs, objects):
+                record.unresolved = []
+                for reference in record.references:
+                    error = self._validate_reference(unparsed, *reference)
+                    if error is not None:
+                        record.unresolved.append(error)
+            for error in record.unresolved:
+                self._report(error)
+
+    def _objects(self, schema_type):
+        """Return the set of names of objects in the given schema type."""
+        if isinstance(schema_type, SchemaContainerList):
+            schema_type = schema_type.content
+        if isinstance(schema_type, SchemaObject):
+            return {schema_type.name} | {subobj.name for subobj in schema_type.subobjs}
+        return set()
+
+    def _report(self, message):
+        logger.debug("Validation error %s", message)
+        self.errors.append(message)
+
+    def _error(self, location, message):
+        if location:
+            message = f"{location}: {message}"
+        self.record.events.append(("error", message))
+        self._report(message)
+
+    def _context(self, location, token, schema_type, ancestors, key):
+        """Return the context of a file in DB content, which must be unchanged to
+        replay its validation record."""
+        return (
+            location,
+            token,
+            str(schema_type),
+            key,
+            tuple(
+                (schema_object.name, tuple(sorted(literal.keys())))
+                for schema_object, literal in ancestors
+            ),
+        )
+
+    def _validate_file(self, location, token, file, schema_type, ancestors):
+        context = self._context(location, token, schema_type, ancestors, file.key)
+        record = file.record
+        if record is not None and record.context == context:
+            self.records.append(record)
+            self.replayed.add(file.path)
+            for event in record.events:
+                if event[0] == "error":
+                    self._report(event[1])
+                else:
+                    self._check_key(*event[1:])
+            for target in record.targets:
+                self._merge_target(*target)
+            return
+        file.load()
+        parent = self.record
+        self.record = DBValidationRecord(file.path, context=context)
+        self.records.append(self.record)
+        if file.error is not None:
+            self._error(location, file.error)
+            self.record.unparsed = self._objects(schema_type)
+        else:
+            self.record.stats = file.loader.stats
+            self.record.digest = file.loader.digest
+            literal = file.loader.content
+            if file.key is not None and isinstance(literal, dict):
+                literal = {**{file.key[0]: file.key[1]}, **literal}
+            self._validate_type(location, token, literal, schema_type, ancestors)
+        self.record = parent
+
+    def _validate_type(self, location, token, literal, schema_type, ancestors):
+        """Validate literal of the given schema type. Return the value as it would be
+        loaded in DB for native and defined types, or None."""
+        if isinstance(literal, DBValidationFile):
+            self._validate_file(location, token, literal, schema_type, ancestors)
+        elif isinstance(schema_type, SchemaNativeType):
+            if type(literal) is not schema_type.native:
+                self._error(
+                    location,
+                    f"{token} {literal} is not a valid {schema_type.native.__name__}",
+                )
+                return None
+            return literal
+        elif isinstance(schema_type, SchemaDefinedType):
+            try:
+                return schema_type.load(literal)
+            except DBFormatError as err:
+                self._error(location, err)
+        elif isinstance(schema_type, SchemaExpandable):
+            if not isinstance(literal, str):
+                self._error(
+                    location,
+                    f"token {token} of {schema_type} is not a valid expandable str",
+                )
+                return None
+            try:
+                return NodeSet(literal)
+            except (NodeSetParseError, RangeSetParseError) as err:
+                self._error(location, f"token {token} {literal} is not valid: {err}")
+        elif isinstance(schema_type, SchemaRangeId):
+            if type(literal) is not int:
+                self._error(
+                    location,
+                    f"token {token} of {schema_type} is not a valid rangeid integer",
+                )
+                return None
+            return literal
+        elif isinstance(schema_type, SchemaContainerList):
+            self._validate_list(location, token, literal, schema_type, ancestors)
+        elif isinstance(schema_type, SchemaObject):
+            self._validate_object(location, literal, schema_type, ancestors)
+        elif isinstance(schema_type, SchemaReference):
+            self.record.references.append(
+                (location, token, literal, schema_type.obj.name, schema_type.prop)
+            )
+        elif isinstance(schema_type, SchemaBackReference):
+            self._error(
+                location,
+                f"Back reference {token} cannot be defined in database for object "
+                f"{schema_type}",
+            )
+        else:
+            self._error(
+                location,
+                f"Unknow literal {literal} for token {token} for type {schema_type}",
+            )
+        return None
+
+    def _validate_list(self, location, token, literal, schema_type, ancestors):
+        content = schema_type.content
+        if not isinstance(literal, list):
+            if (
+                isinstance(literal, dict)
+                and isinstance(content, SchemaObject)
+                and content.has_key()
+            ):
+                key_property = content.key_property()
+                literal = [
+                    (
+                        {**{key_property: key}, **value}
+                        if isinstance(value, dict)
+                        else (
+                            value.keyed(key_property, key)
+                            if isinstance(value, DBValidationFile)
+                            else value
+                        )
+                    )
+                    for key, value in literal.items()
+                ]
+            else:
+                self._error(location, f"token {token} {schema_type} must be a list")
+                return
+        key_property = None
+        if isinstance(content, SchemaObject) and content.has_key():
+            key_property = content.key_property()
+        for index, item in enumerate(literal):
+            # Name items after their keys when available, or their indexes.
+            name = index
+            if key_property is not None:
+                if isinstance(item, DBValidationFile) and item.key is not None:
+                    name = item.key[1]
+                elif isinstance(item, dict) and isinstance(
+                    item.get(key_property), (str, int)
+                ):
+                    name = item[key_property]
+            self._validate_type(f"{location}[{name}]", token, item, content, ancestors)
+
+    def _validate_object(
+        self, location, literal, schema_object: SchemaObject, ancestors, ignored=set()
+    ):
+        if not isinstance(literal, dict):
+            self._error(location, f"{literal} is not a valid {schema_object}")
+            return
+        ancestors = ancestors + [(schema_object, literal)]
+        # Values of properties as they would be loaded in DB
+        values = {}
+        for token, value in literal.items():
+            prop = schema_object.prop(token)
+            if prop is None:
+                self._error(
+                    location,
+                    f"Property {token} is not defined in schema for object "
+                    f"{schema_object}",
+                )
+                continue
+            values[token] = self._validate_type(
+                f"{location}.{token}" if location else token,
+                token,
+                value,
+                prop.type,
+                ancestors,
+            )
+        for prop in schema_object.properties:
+            if isinstance(prop.type, SchemaBackReference):
+                self._validate_back_reference(location, prop, ancestors)
+                continue
+            if prop.name not in literal:
+                if prop.required and prop.name not in ignored:
+                    self._error(
+                        location,
+                        f"Property {prop.name} is required in schema for object "
+                        f"{schema_object}",
+                    )
+                    continue
+                if prop.default is not None:
+                    values[prop.name] = self._validate_type(
+                        location, prop.name, prop.default, prop.type, ancestors
+                    )
+            if prop.key and values.get(prop.name) is not None:
+                self._validate_key(location, schema_object, values[prop.name])
+            if (schema_object.name, prop.name) in self.targets:
+                self._add_target(schema_object, prop, values)
+
+    def _validate_key(self, location, schema_object, value):
+        self.record.events.append(
+            ("key", location, schema_object.name, str(schema_object), value)
+        )
+        self._check_key(location, schema_object.name, str(schema_object), value)
+
+    def _check_key(self, location, name, label, value):
+        if isinstance(value, NodeSet):
+            ranges = self.ranges.setdefault(name, NodeSet())
+            duplicates = ranges.intersection(value)
+            if duplicates:
+                self._report(
+                    f"{location}: Key value {duplicates} of {label} is not unique."
+                )
+            ranges.update(value)
+            return
+        keys = self.keys.setdefault(name, set())
+        try:
+            if value in keys:
+                self._report(f"{location}: Key value {value} of {label} is not unique.")
+            keys.add(value)
+        except TypeError:
+            # unhashable key value cannot be checked
+            pass
+
+    def _add_target(self, schema_object, prop, values):
+        """Add the value of the given object property to the reference targets."""
+        value = values.get(prop.name)
+        size = None
+        if (
+            schema_object.expandable
+            and isinstance(prop.type, SchemaRangeId)
+            and value is not None
+        ):
+            # Expanded objects have consecutive rangeid values, starting with the
+            # given value.
+            size = 1
+            for _value in values.values():
+                if isinstance(_value, NodeSet):
+                    size = len(_value)
+        target = (schema_object.name, prop.name, value, size)
+        self.record.targets.append(target)
+        self._merge_target(*target)
+
+    def _merge_target(self, name, prop, value, size):
+        targets = self.values.setdefault((name, prop), DBReferenceTargets())
+        if value is None:
+            return
+        if isinstance(value, NodeSet):
+            targets.nodesets.append(value)
+        elif size is not None:
+            targets.intranges.append((value, value + size))
+        else:
+            try:
+                targets.values.add(value)
+            except TypeError:
+                # unhashable value cannot be referenced
+                pass
+
+    def _validate_reference(self, unparsed, location, token, literal, name, prop):
+        """Return the error message if the reference cannot be resolved, or None."""
+        if name in unparsed:
+            return None
+        targets = self.values.get((name, prop))
+        if targets is None:
+            return (
+                f"{location}: Unable to find {token} {literal} reference because "
+                f"objects {name} are missing in DB"
+            )
+        elif literal not in targets:
+            return f"{location}: Unable to find {token} reference with value {literal}"
+        return None
+
+    def _validate_back_reference(self, location, prop, ancestors):
+        back_reference = prop.type
+        for schema_object, literal in reversed(ancestors):
+            if schema_object is back_reference.obj:
+                break
+        else:
+            self._error(
+                location,
+                f"Unable to find object {back_reference.obj.name} back referenced by "
+                f"property {prop.name}",
+            )
+            return
+        if back_reference.prop is None:
+            return
+        target = schema_object.prop(back_reference.prop)
+        if back_reference.prop not in literal and (
+            target is None or target.default is None
+        ):
+            self._error(
+                location,
+                f"Property {back_reference.prop} of {schema_object} back referenced "
+                f"by property {prop.name} is not defined",
+            )
@@ -4,11 +4,15 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from typing import List, Dict, Union
+import logging
+from typing import List, Dict, Union, Callable, Optional
 from itertools import chain
 
+from .db import DBDict, DBList, DBExpandedObject, DBFilterView
 from .errors import DBViewError
 
+logger = logging.getLogger(__name__)
+
 
 class DBActionParameter:
     def __init__(
@@ -68,9 +72,72 @@ class DBViewParameter(DBActionParameter):
 
 class DBViewFilter(DBActionParameter):
     def __init__(
-        self, name: str, description: str, nargs: Union[str, int, None] = None
+        self,
+        name: str,
+        description: str,
+        nargs: Union[str, int, None] = None,
+        index: Optional[Callable] = None,
     ):
         super().__init__(name, description, nargs=nargs)
+        # Optional function with the database and the filter value in arguments,
+        # that returns the candidate objects for this filter selected with an index
+        # of the database.
+        self.index = index
+
+
+def candidates(db, data, values):
+    """Return a DBDict or a DBList, depending on the type of data collection, with
+    the given values of this collection sorted in the order of the collection. The
+    values that are not in the collection are discarded. For DBList, expanded
+    values are accepted and sorted by their index in their expandable objects."""
+    if isinstance(data, DBDict):
+        positions = db.cached(
+            data,
+            "positions",
+            lambda: {
+                id(value): (position, key)
+                for position, (key, value) in enumerate(data.items())
+            },
+        )
+        result = DBDict()
+        for _id in sorted(
+            {id(value) for value in values if id(value) in positions},
+            key=lambda _id: positions[_id][0],
+        ):
+            key = positions[_id][1]
+            result[key] = data[key]
+        return result
+
+    def build():
+        result = {}
+        for position, value in enumerate(data.itervalues()):
+            result[id(value)] = (position, value)
+            # Expanded values of the collection are also found with their
+            # expandable object and their index, as other expanded objects
+            # instances can be given for the same value.
+            if isinstance(value, DBExpandedObject):
+                result[(id(value._expandable), value._index)] = (position, value)
+        return result
+
+    positions = db.cached(data, "positions", build)
+
+    def position(value):
+        """Return the sort key and the value of the collection for the given value,
+        or None if the value is not in the collection."""
+        if id(value) in positions:
+            _position, value = positions[id(value)]
+            return (_position, 0), value
+        if isinstance(value, DBExpandedObject):
+            key = (id(value._expandable), value._index)
+            if key in positions:
+                _position, value = positions[key]
+                return (_position, 0), value
+            if id(value._expandable) in positions:
+                return (positions[id(value._expandable)][0], value._index), value
+        return None
+
+    selected = [item for item in map(position, values) if item is not None]
+    return DBList(value for _, value in sorted(selected, key=lambda item: item[0]))
 
 
 class DBView:
@@ -132,6 +199,33 @@ class DBViewSet:
         for action in self.ACTIONS:
             yield action
 
+    def select(self, db, view: DBView, filters):
+        """Return a lazy DBFilterView of the objects of the view content that match
+        the given dict of filters values. The filters with values are mapped to the
+        indexes declared in the view, the candidates of the most selective index
+        are selected and the filters are evaluated on these candidates only. The
+        filter of the index is also evaluated, as indexes can select candidates
+        partially matching the filter (ex: expandable objects). Without indexed
+        filter, the filters are evaluated on all objects of the view content."""
+        data = getattr(db, view.content)
+        selected = None
+        for _filter in view.filters:
+            value = filters.get(_filter.name)
+            if _filter.index is None or value is None:
+                continue
+            result = _filter.index(db, value)
+            logger.debug(
+                "Index of %s filter %s selects %d candidates",
+                view.content,
+                _filter.name,
+                len(result),
+            )
+            if selected is None or len(result) < len(selected):
+                selected = result
+        if selected is not None:
+            data = selected
+        return DBFilterView(data, (filters,))
+
     def __getitem__(self, key):
         for view in self.VIEWS:
             if view.content == key:
@@ -0,0 +1,83 @@
+# Copyright (c) 2023 Rackslab
+#
+# This file is part of RacksDB.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from collections import namedtuple
+import importlib.util
+
+from .generic.db import DBDict, DBExpandableObject
+
+# Use NumPy arrays to accumulate the sizes of equipments in racks when available, or
+# fallback to Python lists. NumPy is imported on first computation of occupancy
+# only, to avoid its import cost when occupancy is not requested.
+if importlib.util.find_spec("numpy") is not None:
+    OCCUPANCY_BACKEND = "numpy"
+else:
+    OCCUPANCY_BACKEND = "python"
+
+RacksDBRackOccupancy = namedtuple(
+    "RacksDBRackOccupancy", ["fillrate", "used", "free", "equipments"]
+)
+
+
+def _accumulate(positions, sizes, counts, length):
+    """Return the lists of sums of sizes and sums of counts of equipments by
+    positions of racks. The total size of every group of equipments is added in the
+    same order with all backends, so that the sums are the same."""
+    if OCCUPANCY_BACKEND == "numpy":
+        import numpy
+
+        positions = numpy.array(positions, dtype=int)
+        counts = numpy.array(counts, dtype=int)
+        used = numpy.zeros(length)
+        numpy.add.at(used, positions, numpy.array(sizes, dtype=float) * counts)
+        equipments = numpy.bincount(positions, weights=counts, minlength=length)
+        return used.tolist(), [int(count) for count in equipments]
+    used = [0.0] * length
+    equipments = [0] * length
+    for position, size, count in zip(positions, sizes, counts):
+        used[position] += size * count
+        equipments[position] += count
+    return used, equipments
+
+
+def racks_occupancy(racks, racks_parts):
+    """Return the DBDict of racks names to their RacksDBRackOccupancy, computed in
+    one pass over the given dictionnary of racks names to the infrastructures
+    layout parts in these racks."""
+    names = {}
+    slots = []
+    for rack in racks:
+        if rack.name not in names:
+            names[rack.name] = len(slots)
+            slots.append(rack.type.slots)
+    positions = []
+    sizes = []
+    counts = []
+    for name, parts in racks_parts.items():
+        position = names[name]
+        for part in parts:
+            for equipments in (part.nodes, part.storage, part.network):
+                # Iterate over the values of DBDict instead of the DBDict itself to
+                # avoid instanciation of expanded objects, they all have the type
+                # of their expandable object.
+                for equipment in equipments.values():
+                    positions.append(position)
+                    sizes.append(equipment.type.height * equipment.type.width)
+                    counts.append(
+                        len(equipment._range())
+                        if isinstance(equipment, DBExpandableObject)
+                        else 1
+                    )
+    used, equipments = _accumulate(positions, sizes, counts, len(slots))
+    result = DBDict()
+    for name, position in names.items():
+        result[name] = RacksDBRackOccupancy(
+            used[position] / slots[position],
+            used[position],
+            slots[position] - used[position],
+            equipments[position],
+        )
+    return result
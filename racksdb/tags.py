@@ -0,0 +1,126 @@
+# Copyright (c) 2023 Rackslab
+#
+# This file is part of RacksDB.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import functools
+
+from .generic.db import DBExpandedObject
+
+
+class RacksDBTagsIndex:
+    """Inverted index of tags to the datacenters, infrastructures and nodes labelled
+    with these tags. The nodes are indexed by expandable objects, as all expanded
+    nodes have the tags of their expandable object. Tags expressions are evaluated
+    with set operations on the index.
+
+    A tags expression is a list of terms that must all be matched. A term is a tag
+    or alternative tags separated by `|`, a tag prefixed by `!` matches the objects
+    that are not labelled with this tag (ex: ["compute", "ia|gpu", "!servers"]).
+    Characters escaped with a backslash are matched literally, to match tags
+    containing `|` or starting with `!` (ex: "a\\|b", "\\!c")."""
+
+    # Maximum number of memoized evaluated expressions
+    CACHE_SIZE = 128
+
+    def __init__(self, db):
+        # Tags to the sets of ids of labelled objects
+        self._objects = {}
+        # Ids of all indexed objects
+        self._all = set()
+        # Memoized sets of ids of objects matching expressions
+        self._cache = {}
+        # The objects are referenced by their ids in the index so that their ids
+        # cannot be reused while the index is alive.
+        self._refs = {}
+        for datacenter in db.datacenters.values():
+            self._add(datacenter, getattr(datacenter, "tags", []))
+        for infrastructure in db.infrastructures.values():
+            self._add(infrastructure, getattr(infrastructure, "tags", []))
+            for part in infrastructure.layout:
+                for node in part.nodes.values():
+                    self._add(node, node.tags)
+
+    def _add(self, obj, tags):
+        self._refs[id(obj)] = obj
+        self._all.add(id(obj))
+        for tag in tags:
+            self._objects.setdefault(tag, set()).add(id(obj))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=CACHE_SIZE)
+    def _parse(term):
+        """Return the tuple of alternatives of the given term, as pairs of negation
+        flag and tag."""
+        if "\\" not in term:
+            return tuple(
+                (True, tag[1:]) if tag.startswith("!") else (False, tag)
+                for tag in term.split("|")
+            )
+        alternatives = []
+        negated = False
+        tag = []
+        chars = iter(term)
+        for char in chars:
+            if char == "\\":
+                tag.append(next(chars, char))
+            elif char == "|":
+                alternatives.append((negated, "".join(tag)))
+                negated = False
+                tag = []
+            elif char == "!" and not tag and not negated:
+                negated = True
+            else:
+                tag.append(char)
+        alternatives.append((negated, "".join(tag)))
+        return tuple(alternatives)
+
+    def _term(self, term):
+        """Return the set of ids of objects matching the given term."""
+        result = set()
+        for negated, tag in self._parse(term):
+            if negated:
+                result |= self._all - self._objects.get(tag, set())
+            else:
+                result |= self._objects.get(tag, set())
+        return result
+
+    @classmethod
+    def evaluate(cls, tags, expression):
+        """Return True if the given list of tags matches the given tags expression,
+        without index."""
+        return all(
+            any((tag in tags) is not negated for negated, tag in cls._parse(term))
+            for term in expression
+        )
+
+    def select(self, tags):
+        """Return the frozenset of ids of indexed objects matching the given tags
+        expression."""
+        key = tuple(tags)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        result = set(self._all)
+        for term in key:
+            result &= self._term(term)
+        if len(self._cache) >= self.CACHE_SIZE:
+            del self._cache[next(iter(self._cache))]
+        result = self._cache[key] = frozenset(result)
+        return result
+
+    def objects(self, tags):
+        """Return the list of indexed objects matching the given tags expression, in
+        no particular order."""
+        return [self._refs[_id] for _id in self.select(tags)]
+
+    def match(self, obj, tags):
+        """Return True if the given object matches the given tags expression."""
+        if isinstance(obj, DBExpandedObject):
+            obj = obj._expandable
+        # Objects not found in database are not indexed.
+        if id(obj) not in self._all:
+            return self.evaluate(getattr(obj, "tags", []), tags)
+        return id(obj) in self.select(tags)
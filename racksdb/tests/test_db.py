@@ -0,0 +1,526 @@
+# Copyright (c) 2023 Rackslab
+#
+# This file is part of RacksDB.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+import concurrent.futures
+import copy
+import gc
+import pickle
+import sys
+import tempfile
+import weakref
+from unittest import mock
+
+from ClusterShell.NodeSet import NodeSet
+
+from racksdb.generic.schema import Schema
+from racksdb.generic.db import (
+    GenericDB,
+    DBFileLoader,
+    DBExpandedObject,
+    DBList,
+    DBDict,
+    DBObjectRange,
+)
+from racksdb.generic.errors import DBFormatError
+
+
+class FakeSchemaLoader:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeTypesLoader:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeDBLoader:
+    def __init__(self, content):
+        self.content = content
+        # Top-level keys retrieved with get()
+        self.retrieved = []
+
+    def keys(self):
+        return list(self.content.keys())
+
+    def get(self, key):
+        self.retrieved.append(key)
+        return self.content[key]
+
+
+VALID_SCHEMA = {
+    "_version": "1",
+    "_content": {
+        "properties": {
+            "catalog": {"type": ":Catalog"},
+            "store": {"type": ":Store"},
+            "labels": {"type": "list[:Label]", "optional": True},
+        }
+    },
+    "_objects": {
+        "Catalog": {
+            "properties": {
+                "varieties": {"type": "list[:Variety]"},
+            }
+        },
+        "Store": {
+            "properties": {
+                "crates": {"type": "list[:Crate]"},
+            }
+        },
+        "Variety": {
+            "properties": {
+                "name": {"type": "str", "key": True},
+                "color": {"type": "str"},
+            }
+        },
+        "Crate": {
+            "properties": {
+                "name": {"type": "expandable", "key": True},
+                "slot": {"type": "rangeid", "default": 0},
+                "variety": {"type": "$Variety.name"},
+            }
+        },
+        "Label": {
+            "properties": {
+                "crate": {"type": "$Crate.name"},
+                "text": {"type": "str"},
+            }
+        },
+    },
+}
+
+VALID_DB = {
+    "catalog": {
+        "varieties": [
+            {"name": "gala", "color": "red"},
+            {"name": "granny", "color": "green"},
+        ],
+    },
+    "store": {
+        "crates": [
+            {"name": "crate[01-10]", "variety": "gala"},
+            {"name": "crate[11-20]", "variety": "granny", "slot": 10},
+        ],
+    },
+    "labels": [
+        {"crate": "crate05", "text": "fragile"},
+        {"crate": "crate12", "text": "fresh"},
+    ],
+}
+
+
+def load_db(content, schema_content=VALID_SCHEMA, lazy=False):
+    schema = Schema(FakeSchemaLoader(schema_content), FakeTypesLoader({}))
+    # This test module is given as the module of bases classes, it does not
+    # provide any base class.
+    db = GenericDB("Test", schema, sys.modules[__name__])
+    db._loader = FakeDBLoader(content)
+    db.load(db._loader, lazy)
+    return db
+
+
+class TestDB(unittest.TestCase):
+    def test_load(self):
+        db = load_db(VALID_DB)
+        self.assertEqual(len(db.catalog.varieties), 2)
+        self.assertEqual(len(db.store.crates), 20)
+
+    def test_key_index(self):
+        db = load_db(VALID_DB)
+        self.assertIs(db.find_object("Variety", "gala"), db.catalog.varieties["gala"])
+        self.assertIsNone(db.find_object("Variety", "fuji"))
+        self.assertIsNone(db.find_object("Unknown", "gala"))
+        # Expandable objects are indexed by their expanded keys.
+        crate = db.find_object("Crate", "crate13")
+        self.assertIsInstance(crate, DBExpandedObject)
+        self.assertEqual((crate.name, crate.slot), ("crate13", 12))
+        self.assertIsNone(db.find_object("Crate", "crate21"))
+
+    def test_key_not_unique(self):
+        content = copy.deepcopy(VALID_DB)
+        content["catalog"]["varieties"].append({"name": "gala", "color": "yellow"})
+        with self.assertRaisesRegex(
+            DBFormatError, "Key value gala of SchemaVariety is not unique."
+        ):
+            load_db(content)
+        # Expanded keys of different expandable objects must be unique.
+        content = copy.deepcopy(VALID_DB)
+        content["store"]["crates"].append({"name": "crate[20-21]", "variety": "gala"})
+        with self.assertRaisesRegex(
+            DBFormatError, "Key value crate20 of SchemaCrate\\+ is not unique."
+        ):
+            load_db(content)
+
+    def test_referenced_index(self):
+        schema = copy.deepcopy(VALID_SCHEMA)
+        schema["_objects"]["Label"]["properties"]["color"] = {
+            "type": "$Variety.color",
+            "optional": True,
+        }
+        content = copy.deepcopy(VALID_DB)
+        content["catalog"]["varieties"].append({"name": "fuji", "color": "red"})
+        content["labels"][0]["color"] = "red"
+        db = load_db(content, schema)
+        # Properties targeted by references are indexed, the first object is kept
+        # for duplicate values.
+        gala = db.catalog.varieties["gala"]
+        self.assertIs(db.find_object("Variety", "red", "color"), gala)
+        self.assertIs(db.labels[0].color, gala)
+        # Properties that are not keys nor targeted by references are not indexed.
+        self.assertIsNone(db.find_object("Label", "fresh", "text"))
+        self.assertIsNone(db.find_object("Label", "fresh"))
+
+    def test_references(self):
+        db = load_db(VALID_DB)
+        self.assertIs(db.store.crates.first().variety, db.catalog.varieties["gala"])
+        # References to expandable objects are resolved with expanded objects.
+        self.assertEqual(db.labels[0].crate.name, "crate05")
+        self.assertEqual(db.labels[0].crate.slot, 4)
+        self.assertEqual(db.labels[1].crate.name, "crate12")
+        self.assertEqual(db.labels[1].crate.slot, 11)
+        self.assertIs(db.labels[1].crate.variety, db.catalog.varieties["granny"])
+
+    def test_reference_not_found(self):
+        content = copy.deepcopy(VALID_DB)
+        content["labels"].append({"crate": "crate21", "text": "missing"})
+        with self.assertRaisesRegex(
+            DBFormatError, "Unable to find crate reference with value crate21"
+        ):
+            load_db(content)
+
+    def test_classes(self):
+        db = load_db(VALID_DB)
+        # Classes are generated once per object type and reused for all objects.
+        varieties = list(db.catalog.varieties)
+        self.assertEqual(type(varieties[0]).__name__, "TestVariety")
+        self.assertIs(type(varieties[0]), type(varieties[1]))
+        crates = list(db.store.crates)
+        self.assertEqual(type(crates[0]).__name__, "TestCrate")
+        self.assertIs(type(crates[0]), type(crates[15]))
+        expandables = list(db.store.crates.values())
+        self.assertEqual(type(expandables[0]).__name__, "TestExpandableCrate")
+        self.assertIs(type(expandables[0]), type(expandables[1]))
+        self.assertIs(type(db.labels[0].crate), type(crates[0]))
+
+    def test_cached(self):
+        db = load_db(VALID_DB)
+        data = DBList(["a"])
+        value = db.cached(data, "test", object)
+        self.assertIs(db.cached(data, "test", object), value)
+        # Objects are kept alive with their cached values, so that their ids cannot
+        # be reused by other objects.
+        ref = weakref.ref(data)
+        del data
+        gc.collect()
+        self.assertIsNotNone(ref())
+        self.assertIsNot(db.cached(DBList(["a"]), "test", object), value)
+
+    def test_slots(self):
+        db = load_db(VALID_DB)
+        # Objects attributes are stored in slots, without instance dict.
+        variety = db.catalog.varieties["gala"]
+        self.assertFalse(hasattr(variety, "__dict__"))
+        self.assertEqual(
+            list(variety._vars().keys()),
+            ["_db", "_schema", "_parent", "name", "color", "_key"],
+        )
+        crate = db.labels[0].crate
+        self.assertFalse(hasattr(crate, "__dict__"))
+        self.assertEqual(crate._vars()["slot"], 4)
+
+    def test_vars_order(self):
+        content = copy.deepcopy(VALID_DB)
+        content["catalog"]["varieties"][1] = {"color": "green", "name": "granny"}
+        content["store"]["crates"][1] = {
+            "slot": 10,
+            "name": "crate[11-20]",
+            "variety": "granny",
+        }
+        db = load_db(content)
+        # Attributes are returned in the order of DB content, followed by the
+        # attributes assigned with default values.
+        self.assertEqual(
+            [key for key in db.catalog.varieties["granny"]._vars() if key[0] != "_"],
+            ["color", "name"],
+        )
+        self.assertEqual(
+            [key for key in db.store.crates["crate01"]._vars() if key[0] != "_"],
+            ["variety", "name", "slot"],
+        )
+        self.assertEqual(
+            [key for key in list(db.store.crates.values())[1]._vars() if key[0] != "_"],
+            ["slot", "name", "variety"],
+        )
+        # Range and rangeid attributes of expanded objects come last.
+        self.assertEqual(
+            [key for key in db.store.crates["crate11"]._vars() if key[0] != "_"],
+            ["variety", "name", "slot"],
+        )
+        # Order is kept in DB snapshots.
+        variety = pickle.loads(pickle.dumps(db.catalog.varieties["granny"]))
+        self.assertEqual(
+            [key for key in variety._vars() if key[0] != "_"], ["color", "name"]
+        )
+
+    def test_expanded(self):
+        db = load_db(VALID_DB)
+        crates = list(db.store.crates)
+        # Expanded objects are views on their expandable objects with their
+        # indexes, the other attributes are resolved on access.
+        crate = crates[12]
+        self.assertIsInstance(crate, DBExpandedObject)
+        self.assertEqual(type(crate).__slots__, ("_expandable", "_index"))
+        self.assertIs(crate._expandable, list(db.store.crates.values())[1])
+        self.assertEqual(crate._index, 2)
+        self.assertEqual(crate.name, "crate13")
+        self.assertEqual(crate._key, "crate13")
+        self.assertEqual(crate.slot, 12)
+        self.assertIs(crate.variety, db.catalog.varieties["granny"])
+        self.assertEqual(crate._first.name, "crate11")
+        self.assertEqual(crate._vars()["name"], "crate13")
+        # Views on the same expanded object are equal.
+        self.assertEqual(db.store.crates["crate13"], crate)
+        self.assertNotEqual(crates[11], crate)
+        with self.assertRaises(AttributeError):
+            crate.size
+        # Expanded objects are restored from pickled views.
+        label = pickle.loads(pickle.dumps(db.labels[1]))
+        self.assertEqual(label.crate.name, "crate12")
+        self.assertEqual(label.crate.slot, 11)
+
+    def test_dict_expanded_keys(self):
+        db = load_db(VALID_DB)
+        crates = DBDict()
+        for key, value in db.store.crates.items():
+            crates[key] = value
+        self.assertIsNone(crates._expanded_keys)
+        crate = crates["crate15"]
+        self.assertEqual(crate.name, "crate15")
+        self.assertEqual(crate._index, 4)
+        # Index of expanded keys is built on first lookup, without expanding
+        # objects.
+        self.assertEqual(len(crates._expanded_keys), 20)
+        with self.assertRaises(KeyError):
+            crates["crate21"]
+        # Index of expanded keys is reset when dictionnary is modified.
+        extra = DBObjectRange("crate[21-22]")
+        crates[extra] = list(crates.values())[0]
+        self.assertIsNone(crates._expanded_keys)
+        self.assertEqual(crates["crate22"]._index, 1)
+        # Folded keys are found with the index of expanded keys.
+        self.assertIs(crates.folded_key("crate22"), extra)
+        self.assertIs(crates.folded_key(extra), extra)
+        del crates[extra]
+        with self.assertRaises(KeyError):
+            crates["crate22"]
+        with self.assertRaises(KeyError):
+            crates.folded_key("crate22")
+        # Index of expanded keys is also reset by in-place union.
+        self.assertEqual(crates["crate15"]._index, 4)
+        result = crates
+        crates |= {extra: list(crates.values())[0]}
+        self.assertIs(crates, result)
+        self.assertIsNone(crates._expanded_keys)
+        self.assertEqual(crates["crate22"]._index, 1)
+        # Index of expanded keys is not pickled.
+        self.assertIsNone(pickle.loads(pickle.dumps(crates))._expanded_keys)
+
+    def test_len_first(self):
+        db = load_db(VALID_DB)
+        variety = db.catalog.varieties["gala"]
+        crates = DBList([variety, *db.store.crates.values(), variety])
+        init = DBExpandedObject.__init__
+        indexes = []
+
+        def count(obj, expandable, index):
+            indexes.append(index)
+            init(obj, expandable, index)
+
+        # Only the requested expanded objects are instanciated.
+        with mock.patch.object(DBExpandedObject, "__init__", count):
+            self.assertEqual(len(crates), 22)
+            self.assertEqual(len(db.store.crates), 20)
+            self.assertEqual(indexes, [])
+            self.assertIs(crates.first(), variety)
+            self.assertEqual(crates[1].name, "crate01")
+            self.assertEqual(crates[12].name, "crate12")
+            self.assertEqual(crates[-2].name, "crate20")
+            self.assertIs(crates[-1], variety)
+            self.assertEqual(db.store.crates.first().name, "crate01")
+            self.assertEqual(indexes, [0, 1, 9, 0])
+        self.assertEqual([crate.name for crate in crates[2:4]], ["crate02", "crate03"])
+        with self.assertRaises(IndexError):
+            crates[22]
+        with self.assertRaises(IndexError):
+            crates[-23]
+        with self.assertRaises(IndexError):
+            DBList().first()
+        with self.assertRaises(IndexError):
+            DBDict().first()
+
+    def test_expanded_cache(self):
+        db = load_db(VALID_DB)
+        self.assertIsNone(db.expanded_cache_info())
+        self.assertIsNot(db.store.crates.first(), db.store.crates.first())
+        db.cache_expanded(20)
+        # Repeated iterations and lookups return the same instances.
+        crates = list(db.store.crates)
+        for crate, _crate in zip(crates, db.store.crates):
+            self.assertIs(crate, _crate)
+        self.assertIs(db.store.crates["crate20"], crates[19])
+        self.assertEqual(tuple(db.expanded_cache_info()), (21, 20, 20, 20))
+        # Least recently used expanded objects are evicted.
+        db.cache_expanded(15)
+        crates = list(db.store.crates)
+        self.assertIs(db.store.crates["crate06"], crates[5])
+        self.assertIsNot(db.store.crates.first(), crates[0])
+        self.assertEqual(tuple(db.expanded_cache_info()), (1, 21, 15, 15))
+        # Expanded objects cache is not saved in DB snapshots.
+        self.assertIsNone(pickle.loads(pickle.dumps(db)).expanded_cache_info())
+        db.cache_expanded(0)
+        self.assertIsNone(db.expanded_cache_info())
+
+    def test_expanded_cache_threads(self):
+        db = load_db(VALID_DB)
+        db.cache_expanded(3)
+
+        def iterate(_):
+            for _ in range(200):
+                for crate in db.store.crates:
+                    pass
+
+        # The cache is shared by concurrent threads, with consistent statistics.
+        # Threads switch frequently to exercise concurrent updates of the cache.
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(iterate, range(8)))
+        finally:
+            sys.setswitchinterval(interval)
+        info = db.expanded_cache_info()
+        self.assertEqual(info.hits + info.misses, 8 * 200 * 20)
+        self.assertEqual(info.size, 3)
+
+    def test_object_range(self):
+        for rangeset in [
+            "mecn[0001-0040,0050-0060]",
+            "x[8-12,010]",
+            "r1n[1-2,01-02]-ib",
+            "node1",
+            "cn[01-03]-eth[0-1]",
+        ]:
+            _range = DBObjectRange(rangeset)
+            names = list(NodeSet(rangeset))
+            self.assertEqual(list(_range), names)
+            self.assertEqual(len(_range), len(names))
+            self.assertEqual(_range[1:3], names[1:3])
+            for index, name in enumerate(names):
+                self.assertEqual(_range.name_at(index), name)
+                self.assertEqual(_range.index_of(name), index)
+            self.assertEqual(_range[-1], names[-1])
+            with self.assertRaises(IndexError):
+                _range.name_at(len(names))
+            for name in ["mecn0041", "mecn041", "x7", "x0010", "r1n3-ib", "cn04"]:
+                self.assertNotIn(name, _range)
+                with self.assertRaises(ValueError):
+                    _range.index_of(name)
+        # Single pattern and single dimension ranges are not expanded.
+        _range = DBObjectRange("mecn[0001-4000]")
+        self.assertEqual(_range.index_of("mecn2001"), 2000)
+        self.assertEqual(_range.name_at(2000), "mecn2001")
+        self.assertIsNone(_range._names)
+
+    def test_subsets(self):
+        db = load_db(VALID_DB)
+        crates = list(db.store.crates.values())[1]
+        # Expandable object is generated as is when all its names are selected.
+        self.assertEqual(list(crates.subsets(NodeSet("crate[01-30]"))), [crates])
+        self.assertEqual(list(crates.subsets(NodeSet("crate[01-10]"))), [])
+        # Subsets are generated for runs of consecutive positions, with shifted
+        # rangeid attributes.
+        subsets = list(crates.subsets(NodeSet("crate[13-14,16]")))
+        self.assertEqual(
+            [str(subset.name) for subset in subsets], ["crate[13-14]", "crate16"]
+        )
+        self.assertIs(subsets[0]._key, subsets[0].name)
+        self.assertEqual(
+            [
+                (crate.name, crate.slot)
+                for subset in subsets
+                for crate in subset.objects()
+            ],
+            [("crate13", 12), ("crate14", 13), ("crate16", 15)],
+        )
+        self.assertIs(subsets[1].variety, crates.variety)
+        # The original expandable object is not modified.
+        self.assertEqual(str(crates.name), "crate[11-20]")
+        self.assertEqual(len(crates.objects()), 10)
+
+    def test_loader_plan(self):
+        # Declare properties in reverse order of their dependencies in schema and
+        # DB.
+        schema = copy.deepcopy(VALID_SCHEMA)
+        schema["_content"]["properties"] = dict(
+            reversed(schema["_content"]["properties"].items())
+        )
+        content = dict(reversed(VALID_DB.items()))
+        with self.assertLogs("racksdb.generic.db", level="DEBUG") as cm:
+            db = load_db(content, schema)
+        self.assertFalse(any("Skipping object" in line for line in cm.output))
+        self.assertEqual(db.labels[1].crate.name, "crate12")
+        plan = db.loader_plan(db._schema.content)
+        self.assertEqual(
+            [step.prop.name for step in plan.ordered], ["catalog", "store", "labels"]
+        )
+
+    def test_undefined_property(self):
+        content = copy.deepcopy(VALID_DB)
+        content["catalog"]["varieties"][0]["size"] = 1
+        with self.assertRaisesRegex(
+            DBFormatError,
+            "Property size is not defined in schema for object SchemaVariety",
+        ):
+            load_db(content)
+
+    def test_file_loader(self):
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".yml") as fh:
+            fh.write("name: gala\ncolor: red\n")
+            fh.flush()
+            self.assertEqual(
+                DBFileLoader(fh.name).content, {"name": "gala", "color": "red"}
+            )
+
+    def test_file_loader_error(self):
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".yml") as fh:
+            fh.write("name: *unknown\n")
+            fh.flush()
+            with self.assertRaisesRegex(DBFormatError, "found undefined alias"):
+                DBFileLoader(fh.name)
+
+    def test_lazy(self):
+        db = load_db(VALID_DB, lazy=True)
+        self.assertEqual(db._loader.retrieved, [])
+        # Store is loaded on first access, after catalog it depends on.
+        self.assertEqual(len(db.store.crates), 20)
+        self.assertEqual(db._loader.retrieved, ["catalog", "store"])
+        self.assertIs(db.store.crates.first().variety, db.catalog.varieties["gala"])
+        # Labels are loaded by lookup of their objects.
+        self.assertIsNotNone(db.find_objects("Label"))
+        self.assertEqual(db._loader.retrieved, ["catalog", "store", "labels"])
+        self.assertEqual(db.labels[0].crate.name, "crate05")
+        with self.assertRaises(AttributeError):
+            db.unknown
+
+    def test_lazy_required(self):
+        content = copy.deepcopy(VALID_DB)
+        del content["store"]
+        with self.assertRaisesRegex(
+            DBFormatError, "Property store is required in schema for object "
+        ):
+            load_db(content, lazy=True)
@@ -0,0 +1,62 @@
+# Copyright (c) 2023 Rackslab
+#
+# This file is part of RacksDB.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from racksdb.generic.definedtype import SchemaDefinedType
+from racksdb.generic.errors import DBFormatError
+
+
+class SchemaDefinedTypeSize(SchemaDefinedType):
+
+    pattern = r"(\d+)(k)?"
+    native = int
+
+    def parse(self, value):
+        match = self._match(value)
+        size = int(match.group(1))
+        if match.group(2) == "k":
+            size *= 1000
+        return size
+
+
+class TestSchemaDefinedType(unittest.TestCase):
+    def test_regex(self):
+        # Regular expression is compiled once per class.
+        self.assertIs(SchemaDefinedTypeSize._regex, SchemaDefinedTypeSize()._regex)
+        self.assertEqual(SchemaDefinedTypeSize._regex.pattern, r"(\d+)(k)?")
+
+    def test_load(self):
+        defined_type = SchemaDefinedTypeSize()
+        self.assertEqual(defined_type.load("2k"), 2000)
+        self.assertEqual(defined_type.load("2k"), 2000)
+        self.assertEqual(defined_type.load(2), 2)
+        self.assertEqual(defined_type.load("2"), 2)
+        info = defined_type.cache_info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 3)
+        self.assertEqual(info.size, 3)
+
+    def test_load_bounded(self):
+        defined_type = SchemaDefinedTypeSize()
+        defined_type.CACHE_SIZE = 2
+        for value in ["1k", "2k", "3k"]:
+            defined_type.load(value)
+        self.assertEqual(defined_type.cache_info().size, 2)
+        # Oldest value has been evicted
+        defined_type.load("1k")
+        self.assertEqual(defined_type.cache_info().misses, 4)
+        defined_type.load("3k")
+        self.assertEqual(defined_type.cache_info().hits, 1)
+
+    def test_load_error(self):
+        defined_type = SchemaDefinedTypeSize()
+        for _ in range(2):
+            with self.assertRaisesRegex(
+                DBFormatError, "Unable to match ~.* pattern with value fail"
+            ):
+                defined_type.load("fail")
+        self.assertEqual(defined_type.cache_info().size, 0)
@@ -0,0 +1,170 @@
+# Copyright (c) 2023 Rackslab
+#
+# This file is part of RacksDB.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+from unittest import mock
+import copy
+import os
+import tempfile
+from pathlib import Path
+
+import yaml
+
+from racksdb.generic.schema import Schema
+from racksdb.generic.db import DBSplittedFilesLoader
+from racksdb.generic.validator import DBValidator, DBValidationCache
+from racksdb.generic.errors import DBFormatError
+
+from .test_db import FakeSchemaLoader, FakeTypesLoader, VALID_SCHEMA, VALID_DB
+
+
+class FakeDBLoader:
+    def __init__(self, content, errors={}):
+        self.content = content
+        # Parsing errors indexed by top-level keys
+        self.errors = errors
+
+    def keys(self):
+        return list(self.content.keys()) + list(self.errors.keys())
+
+    def get(self, key):
+        if key in self.errors:
+            raise DBFormatError(self.errors[key])
+        return self.content[key]
+
+
+def validate(content, errors={}):
+    schema = Schema(FakeSchemaLoader(VALID_SCHEMA), FakeTypesLoader({}))
+    return DBValidator(schema).validate(FakeDBLoader(content, errors))
+
+
+class TestValidator(unittest.TestCase):
+    def test_valid(self):
+        self.assertEqual(validate(VALID_DB), [])
+
+    def test_errors(self):
+        content = copy.deepcopy(VALID_DB)
+        content["catalog"]["varieties"].append({"name": "gala", "color": 1})
+        content["catalog"]["varieties"].append({"name": "fuji"})
+        content["store"]["crates"].append({"name": "crate[20-21]", "variety": "kiwi"})
+        content["labels"].append({"crate": "crate21", "text": "new", "size": 1})
+        content["labels"].append({"crate": "crate22", "text": "missing"})
+        # All errors are reported with their locations.
+        self.assertEqual(
+            validate(content),
+            [
+                "catalog.varieties[gala].color: color 1 is not a valid str",
+                "catalog.varieties[gala]: Key value gala of SchemaVariety is not "
+                "unique.",
+                "catalog.varieties[fuji]: Property color is required in schema for "
+                "object SchemaVariety",
+                "store.crates[crate[20-21]]: Key value crate20 of SchemaCrate+ is "
+                "not unique.",
+                "labels[2]: Property size is not defined in schema for object "
+                "SchemaLabel",
+                "store.crates[crate[20-21]].variety: Unable to find variety "
+                "reference with value kiwi",
+                "labels[3].crate: Unable to find crate reference with value crate22",
+            ],
+        )
+
+    def test_references_order(self):
+        # References are checked after all objects are collected, independently
+        # of the order of properties in DB.
+        content = dict(reversed(VALID_DB.items()))
+        self.assertEqual(validate(content), [])
+
+    def test_malformed_reference(self):
+        # Reference values that are not valid node names are reported as
+        # references not found.
+        content = copy.deepcopy(VALID_DB)
+        content["labels"].append({"crate": "crate[", "text": "broken"})
+        self.assertEqual(
+            validate(content),
+            ["labels[2].crate: Unable to find crate reference with value crate["],
+        )
+
+    def test_parsing_error(self):
+        content = copy.deepcopy(VALID_DB)
+        del content["catalog"]
+        # The missing property and references to objects of the unparsed key are
+        # not reported.
+        self.assertEqual(
+            validate(content, {"catalog": "found undefined alias"}),
+            ["catalog: found undefined alias"],
+        )
+
+    def validate_files(self, path, cache):
+        """Return the list of errors and the list of parsed files of DB in path."""
+        schema = Schema(FakeSchemaLoader(VALID_SCHEMA), FakeTypesLoader({}))
+        with self.assertLogs("racksdb.generic.validator", level="DEBUG") as cm:
+            errors = DBValidator(schema).validate(
+                DBSplittedFilesLoader(path, lazy=True),
+                DBValidationCache(cache, path, []),
+            )
+        parsed = sorted(
+            Path(line.split()[3]).name
+            for line in cm.output
+            if "Parsing DB file" in line
+        )
+        return errors, parsed
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db = Path(tmpdir).joinpath("db")
+            db.mkdir()
+            cache = Path(tmpdir).joinpath("cache")
+
+            def write(key, content):
+                path = db.joinpath(f"{key}.yml")
+                with open(path, "w") as fh:
+                    yaml.dump(content, fh)
+                # Make sure modification time is updated, whatever the
+                # filesystem timestamps resolution.
+                mtime = path.stat().st_mtime_ns + 10**9
+                os.utime(path, ns=(mtime, mtime))
+
+            for key, content in VALID_DB.items():
+                write(key, content)
+            self.assertEqual(
+                self.validate_files(db, cache),
+                ([], ["catalog.yml", "labels.yml", "store.yml"]),
+            )
+            # Unmodified files are not parsed again.
+            self.assertEqual(self.validate_files(db, cache), ([], []))
+            # All files are parsed again with another version of RacksDB code.
+            with mock.patch(
+                "racksdb.generic.validator.code_digest", return_value="other"
+            ):
+                self.assertEqual(
+                    self.validate_files(db, cache),
+                    ([], ["catalog.yml", "labels.yml", "store.yml"]),
+                )
+            self.assertEqual(
+                self.validate_files(db, cache),
+                ([], ["catalog.yml", "labels.yml", "store.yml"]),
+            )
+            # Only the modified file is parsed, the references of labels are
+            # checked again as the crates they reference are modified.
+            store = copy.deepcopy(VALID_DB["store"])
+            store["crates"][1]["name"] = "crate[13-20]"
+            write("store", store)
+            errors = [
+                "labels[1].crate: Unable to find crate reference with value crate12"
+            ]
+            self.assertEqual(self.validate_files(db, cache), (errors, ["store.yml"]))
+            self.assertEqual(self.validate_files(db, cache), (errors, []))
+            write("store", VALID_DB["store"])
+            self.assertEqual(self.validate_files(db, cache), ([], ["store.yml"]))
+            # Malformed reference values are reported with validation cache.
+            labels = copy.deepcopy(VALID_DB["labels"])
+            labels.append({"crate": "crate[", "text": "broken"})
+            write("labels", labels)
+            errors = [
+                "labels[2].crate: Unable to find crate reference with value crate["
+            ]
+            self.assertEqual(self.validate_files(db, cache), (errors, ["labels.yml"]))
+            self.assertEqual(self.validate_files(db, cache), (errors, []))
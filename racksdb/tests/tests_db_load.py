@@ -4,11 +4,24 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import importlib.util
 import os
 from pathlib import Path
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 
+from ClusterShell.NodeSet import NodeSet
+
+import racksdb.occupancy
 from racksdb import RacksDB
+from racksdb.bases import RacksDBNodeBase
+from racksdb.errors import RacksDBError
+from racksdb.tags import RacksDBTagsIndex
+from racksdb.views import RacksDBViews
+from racksdb.generic.db import DBFilterView, DBDict, DBList
+from racksdb.generic.errors import DBFormatError
 
 
 class TestDBLoad(unittest.TestCase):
@@ -43,6 +56,80 @@ class TestDBLoad(unittest.TestCase):
     def test_load(self):
         RacksDB.load(schema=self.schema_path, db=self.db_path)
 
+    def test_load_workers(self):
+        # Parallel parsing of DB files must build the same content.
+        db = RacksDB.load(schema=self.schema_path, db=self.db_path)
+        parallel = RacksDB.load(schema=self.schema_path, db=self.db_path, workers=4)
+        self.assertEqual(parallel._loader.content, db._loader.content)
+        self.assertEqual(
+            list(parallel._loader.content["datacenters"]),
+            list(db._loader.content["datacenters"]),
+        )
+        self.assertEqual(len(parallel.nodes), len(db.nodes))
+
+    def test_validate(self):
+        self.assertEqual(RacksDB.validate(schema=self.schema_path, db=self.db_path), [])
+
+    def test_validate_errors(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = Path(tmpdir).joinpath("db")
+            shutil.copytree(self.db_path, db_path)
+            with open(db_path.joinpath("types", "racks.yml"), "a") as fh:
+                fh.write(
+                    "- id: standard\n  height: 1867mm\n  width: 600mm\n"
+                    "  depth: 914mm\n  slots: 42u\n"
+                )
+            with open(db_path.joinpath("infrastructures", "broken.yml"), "w") as fh:
+                fh.write("model: [\n")
+            errors = RacksDB.validate(schema=self.schema_path, db=db_path)
+        self.assertEqual(len(errors), 2)
+        self.assertIn("broken.yml", errors[0])
+        self.assertIn("Key value standard of SchemaRackType is not unique.", errors[1])
+
+    def test_validate_load_agree(self):
+        # Errors reported by validation are also raised by load.
+        for old, new, error in [
+            (
+                "- rack: R1-A02\n",
+                "- rack: R1-A[01-02]\n",
+                "Unable to find rack reference with value R1-A\\[01-02\\]",
+            ),
+            (
+                "slot: 21\n",
+                "slot: one\n",
+                "token slot of rangeid is not a valid rangeid integer",
+            ),
+        ]:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                db_path = Path(tmpdir).joinpath("db")
+                shutil.copytree(self.db_path, db_path)
+                db_file = db_path.joinpath("infrastructures", "mercury.yml")
+                content = db_file.read_text()
+                self.assertIn(old, content)
+                db_file.write_text(content.replace(old, new, 1))
+                errors = RacksDB.validate(schema=self.schema_path, db=db_path)
+                self.assertEqual(len(errors), 1)
+                self.assertRegex(errors[0], error)
+                with self.assertRaisesRegex(DBFormatError, error):
+                    RacksDB.load(schema=self.schema_path, db=db_path)
+
+    def test_key_index(self):
+        db = RacksDB.load(schema=self.schema_path, db=self.db_path)
+        self.assertEqual(db.find_object("Node", "mecn0001").name, "mecn0001")
+        # Racks names are indexed as they are targeted by references.
+        self.assertEqual(db.find_object("Rack", "R1-A02", "name").name, "R1-A02")
+        self.assertIsNone(db.find_object("Rack", "R1-A02"))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = Path(tmpdir).joinpath("db")
+            shutil.copytree(self.db_path, db_path)
+            # Duplicate names of nodes in different ranges are reported on load.
+            db_file = db_path.joinpath("infrastructures", "mercury.yml")
+            db_file.write_text(db_file.read_text().replace("mecn0200", "mecn0010"))
+            with self.assertRaisesRegex(
+                DBFormatError, "Key value mecn0010 of SchemaNode\\+ is not unique."
+            ):
+                RacksDB.load(schema=self.schema_path, db=db_path)
+
     def test_content(self):
         db = RacksDB.load(schema=self.schema_path, db=self.db_path)
         self.assertEqual(type(db), RacksDB)
@@ -81,3 +168,458 @@ class TestDBLoad(unittest.TestCase):
         node = db.infrastructures["mercury"].nodes["mecn0001"]
         self.assertEqual(node, node._first)
         # print(db.infrastructures["mercury"].nodes)
+
+    def test_load_lazy(self):
+        db = RacksDB.load(schema=self.schema_path, db=self.db_path, lazy=True)
+        self.assertEqual(db._loader.files, {})
+        # Datacenters files are parsed on first access, with types files for
+        # referenced racks types, but not infrastructures files.
+        self.assertEqual(db.datacenters["paris"].name, "paris")
+        self.assertTrue(db._loader.files)
+        for path in db._loader.files:
+            self.assertNotIn("infrastructures", path.parts)
+        # Infrastructures are loaded with nodes.
+        full = RacksDB.load(schema=self.schema_path, db=self.db_path)
+        self.assertEqual(len(db.nodes), len(full.nodes))
+        self.assertEqual(db._loader.content, full._loader.content)
+
+    def test_reload(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = Path(tmpdir).joinpath("db")
+            shutil.copytree(self.db_path, db_path)
+            db = RacksDB.load(schema=self.schema_path, db=db_path)
+            # Nothing is rebuilt without modification
+            self.assertEqual(db.reload(), set())
+            # Modification of infrastructure file rebuilds only infrastructures
+            infrastructure = db.infrastructures["mercury"]
+            datacenter = db.datacenters["paris"]
+            db_file = db_path.joinpath("infrastructures", "mercury.yml")
+            db_file.write_text(
+                db_file.read_text().replace(
+                    "description: Mercury HPC cluster", "description: Mercury"
+                )
+            )
+            self.assertEqual(db.reload(), {"infrastructures"})
+            self.assertIsNot(db.infrastructures["mercury"], infrastructure)
+            self.assertEqual(db.infrastructures["mercury"].description, "Mercury")
+            self.assertIs(db.datacenters["paris"], datacenter)
+            # Modification of datacenter file rebuilds infrastructures referencing
+            # its racks.
+            rack = db.nodes["mecn0001"].rack
+            db_file = db_path.joinpath("datacenters", "paris.yml")
+            db_file.write_text(db_file.read_text() + "\n")
+            self.assertEqual(db.reload(), {"datacenters", "infrastructures"})
+            self.assertIsNot(db.nodes["mecn0001"].rack, rack)
+            self.assertIs(
+                db.nodes["mecn0001"].rack.row,
+                db.datacenters["paris"].rooms["noisy"].rows["R1"],
+            )
+            # Racks are selected by name with the index of the reloaded racks.
+            views = RacksDBViews()
+            (selected,) = views.select(db, views["racks"], {"name": "R1-A02"})
+            self.assertIs(
+                selected.row, db.datacenters["paris"].rooms["noisy"].rows["R1"]
+            )
+            self.assertEqual(
+                {name: len(objects) for name, objects in db._indexes.items()},
+                {
+                    name: len(objects)
+                    for name, objects in RacksDB.load(
+                        schema=self.schema_path, db=db_path
+                    )._indexes.items()
+                },
+            )
+            # Modification without content change does not rebuild anything
+            stat = db_file.stat()
+            os.utime(db_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.assertEqual(db.reload(), set())
+            # DB is left unmodified in case of error
+            db_path.joinpath("types", "nodes", "sm220bt.yml").unlink()
+            with self.assertRaisesRegex(
+                DBFormatError, "Unable to find type reference with value sm220bt"
+            ):
+                db.reload()
+            self.assertEqual(db.nodes["mecn0001"].type.id, "sm220bt")
+
+    def test_reload_error(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = Path(tmpdir).joinpath("db")
+            shutil.copytree(self.db_path, db_path)
+            db = RacksDB.load(schema=self.schema_path, db=db_path)
+            # Valid modification of types with invalid modification of datacenters
+            types_file = db_path.joinpath("types", "nodes", "sm220bt.yml")
+            types_file.write_text(
+                types_file.read_text().replace(
+                    "model: SuperMicro A+ Server 2124BT-HTR", "model: SuperMicro"
+                )
+            )
+            datacenter_file = db_path.joinpath("datacenters", "paris.yml")
+            content = datacenter_file.read_text()
+            datacenter_file.write_text(
+                content.replace("type: standard", "type: unknown", 1)
+            )
+            with self.assertRaisesRegex(
+                DBFormatError, "Unable to find type reference with value unknown"
+            ):
+                db.reload()
+            self.assertEqual(
+                db.nodes["mecn0001"].type.model, "SuperMicro A+ Server 2124BT-HTR"
+            )
+            # Once the error is fixed, all modifications are applied.
+            datacenter_file.write_text(content + "\n")
+            self.assertEqual(db.reload(), {"types", "datacenters", "infrastructures"})
+            self.assertEqual(db.nodes["mecn0001"].type.model, "SuperMicro")
+
+    def test_collections(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = Path(tmpdir).joinpath("db")
+            shutil.copytree(self.db_path, db_path)
+            db = RacksDB.load(schema=self.schema_path, db=db_path)
+            # Aggregate collections are computed once and cached.
+            nodes = db.nodes
+            racks = db.racks
+            infrastructure_nodes = db.infrastructures["mercury"].nodes
+            self.assertIs(db.nodes, nodes)
+            self.assertIs(db.racks, racks)
+            self.assertIs(db.infrastructures["mercury"].nodes, infrastructure_nodes)
+            # Cached collections are read-only.
+            with self.assertRaisesRegex(TypeError, "object is read-only"):
+                nodes["mecn0001"] = None
+            with self.assertRaisesRegex(TypeError, "object is read-only"):
+                racks.append(None)
+            with self.assertRaisesRegex(TypeError, "object is read-only"):
+                infrastructure_nodes.clear()
+            # Filtered collections are modifiable copies.
+            filtered = nodes.filter(infrastructure="mercury")
+            filtered.clear()
+            self.assertEqual(len(filtered), 0)
+            # Cached collections are reset on reload.
+            db_file = db_path.joinpath("infrastructures", "mercury.yml")
+            db_file.write_text(db_file.read_text() + "\n")
+            self.assertEqual(db.reload(), {"infrastructures"})
+            self.assertIsNot(db.nodes, nodes)
+            self.assertIsNot(db.racks, racks)
+            self.assertEqual(list(db.racks), list(racks))
+            self.assertIsNot(db.nodes["mecn0001"], nodes["mecn0001"])
+            self.assertEqual(len(db.nodes), len(nodes))
+
+    def test_racks_parts(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = Path(tmpdir).joinpath("db")
+            shutil.copytree(self.db_path, db_path)
+            db = RacksDB.load(schema=self.schema_path, db=db_path)
+
+            def occupied(rack):
+                # Sizes of all equipments in rack, found by scanning all layout
+                # parts of all infrastructures.
+                return [
+                    equipment.type.height * equipment.type.width
+                    for infrastructure in db.infrastructures
+                    for part in infrastructure.layout
+                    if part.rack.name == rack.name
+                    for equipments in (part.nodes, part.storage, part.network)
+                    for equipment in equipments
+                ]
+
+            # Racks nodes and fill rates are computed with the index of layout
+            # parts by racks. The total sizes of ranges of equipments are added at
+            # once, they may differ from the sums of individual sizes by rounding
+            # errors.
+            for rack in db.racks:
+                sizes = occupied(rack)
+                self.assertAlmostEqual(rack.fillrate, sum(sizes) / rack.type.slots)
+            rack = db.racks[0]
+            self.assertEqual(rack.name, "R1-A01")
+            self.assertEqual(
+                [node.name for node in rack.nodes],
+                [node.name for node in db.infrastructures["mercury"].layout[0].nodes],
+            )
+            self.assertEqual(len(db.racks[2].nodes), 0)
+            self.assertEqual(db.racks[2].fillrate, 0)
+            # Index of layout parts by racks is reset on reload.
+            db_file = db_path.joinpath("infrastructures", "mercury.yml")
+            db_file.write_text(
+                db_file.read_text().replace("rack: R1-A01", "rack: R1-A03")
+            )
+            self.assertEqual(db.reload(), {"infrastructures"})
+            self.assertEqual(len(db.racks[0].nodes), 0)
+            self.assertEqual(len(db.racks[2].nodes), 61)
+
+    def test_racks_occupancy(self):
+        db = RacksDB.load(schema=self.schema_path, db=self.db_path)
+        occupancy = db.racks_occupancy()
+        self.assertIs(db.racks_occupancy(), occupancy)
+        self.assertEqual(len(occupancy), len(db.racks))
+        self.assertEqual(occupancy["R1-A01"].equipments, 61)
+        self.assertEqual(occupancy["R1-A01"].used, 41)
+        self.assertEqual(occupancy["R1-A01"].free, 1)
+        self.assertEqual(occupancy["R1-A03"], (0, 0, 42, 0))
+        for rack in db.racks:
+            self.assertEqual(occupancy[rack.name].fillrate, rack.fillrate)
+            self.assertEqual(
+                occupancy[rack.name].equipments,
+                sum(
+                    len(part.nodes) + len(part.storage) + len(part.network)
+                    for part in rack._parts()
+                ),
+            )
+
+    def racks_occupancy(self, db, backend):
+        """Return the occupancy of racks computed with the given backend."""
+        with mock.patch.object(racksdb.occupancy, "OCCUPANCY_BACKEND", backend):
+            return racksdb.occupancy.racks_occupancy(db.racks, db._parts_by_racks())
+
+    @unittest.skipUnless(
+        importlib.util.find_spec("numpy") is not None, "NumPy is not available"
+    )
+    def test_racks_occupancy_numpy(self):
+        db = RacksDB.load(schema=self.schema_path, db=self.db_path)
+        occupancy = self.racks_occupancy(db, "numpy")
+        self.assertEqual(occupancy["R1-A01"], (41 / 42, 41, 1, 61))
+        # Sums are the same with NumPy arrays and Python lists.
+        self.assertEqual(occupancy, self.racks_occupancy(db, "python"))
+        for value in occupancy.values():
+            self.assertIs(type(value.used), float)
+            self.assertIs(type(value.equipments), int)
+
+    def test_tags_index(self):
+        db = RacksDB.load(schema=self.schema_path, db=self.db_path)
+        index = db.tags_index()
+        self.assertIs(db.tags_index(), index)
+
+        def names(data, tags):
+            return str(NodeSet.fromlist(item.name for item in data.filter(tags=tags)))
+
+        # Terms are all matched, alternatives are separated by | and negated tags
+        # are prefixed by !.
+        self.assertEqual(names(db.nodes, ["compute"]), "mecn[0001-0116,0200]")
+        self.assertEqual(names(db.nodes, ["servers", "gpu"]), "")
+        self.assertEqual(
+            names(db.nodes, ["servers|gpu"]), "megpu[0001-0008],mesrv[0001-0004]"
+        )
+        self.assertEqual(
+            names(db.nodes, ["compute|servers"]),
+            "mecn[0001-0116,0200],mesrv[0001-0004]",
+        )
+        self.assertEqual(
+            names(db.nodes, ["!compute"]), "megpu[0001-0008],mesrv[0001-0004]"
+        )
+        self.assertEqual(names(db.nodes, ["ia", "!compute"]), "megpu[0001-0008]")
+        self.assertEqual(names(db.datacenters, ["!tier2"]), "")
+        self.assertEqual(names(db.infrastructures, ["hpc|unknown"]), "mercury")
+        # Expanded nodes are matched with their expandable objects.
+        self.assertTrue(index.match(db.nodes["mecn0001"], ["compute"]))
+        self.assertFalse(index.match(db.nodes["mecn0001"], ["!compute"]))
+        # Objects not indexed without tags are matched with an empty list of tags.
+        self.assertFalse(index.match(object(), ["compute"]))
+        self.assertTrue(index.match(object(), ["!compute"]))
+        self.assertEqual(
+            sorted(str(obj.name) for obj in index.objects(["servers|hpc"])),
+            ["mercury", "mesrv[0001-0004]"],
+        )
+        # Evaluated expressions are memoized.
+        self.assertIs(index.select(["compute"]), index.select(["compute"]))
+        self.assertTrue(
+            RacksDBTagsIndex.evaluate(["compute", "hpc"], ["hpc", "gpu|compute", "!ia"])
+        )
+        self.assertFalse(RacksDBTagsIndex.evaluate(["compute"], ["!compute"]))
+        # Escaped characters are matched literally.
+        self.assertTrue(RacksDBTagsIndex.evaluate(["a|b"], ["a\\|b"]))
+        self.assertFalse(RacksDBTagsIndex.evaluate(["a"], ["a\\|b"]))
+        self.assertTrue(RacksDBTagsIndex.evaluate(["!c"], ["\\!c"]))
+        self.assertFalse(RacksDBTagsIndex.evaluate(["c"], ["\\!c"]))
+        self.assertTrue(RacksDBTagsIndex.evaluate(["d\\e"], ["d\\\\e"]))
+
+    def test_tags_index_escaped(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = Path(tmpdir).joinpath("db")
+            shutil.copytree(self.db_path, db_path)
+            db_file = db_path.joinpath("infrastructures", "mercury.yml")
+            db_file.write_text(
+                db_file.read_text().replace(
+                    "tags: [compute]", "tags: [compute, 'a|b', '!c']", 1
+                )
+            )
+            db = RacksDB.load(schema=self.schema_path, db=db_path)
+
+            def names(tags):
+                return str(
+                    NodeSet.fromlist(item.name for item in db.nodes.filter(tags=tags))
+                )
+
+            # Tags containing | or starting with ! are matched with escaped
+            # characters.
+            self.assertEqual(names(["a\\|b"]), "mecn[0001-0060,0200]")
+            self.assertEqual(names(["\\!c"]), "mecn[0001-0060,0200]")
+            self.assertEqual(names(["a", "\\!c"]), "")
+            self.assertEqual(names(["!a\\|b", "compute"]), "mecn[0061-0116]")
+
+    def test_filter_nodes_name(self):
+        db = RacksDB.load(schema=self.schema_path, db=self.db_path)
+        # Expanded nodes are selected by name.
+        nodes = db.nodes.filter(name="mecn0001")
+        self.assertEqual([node.name for node in nodes], ["mecn0001"])
+        # Expandable nodes are restricted to the names in the nodeset, with their
+        # ranges kept folded.
+        nodes = db.nodes.filter(name="mecn[0001-0004,0006],mesrv0002,unknown")
+        self.assertEqual(
+            [str(key) for key in nodes.keys()],
+            ["mecn[0001-0004]", "mecn0006", "mesrv0002"],
+        )
+        self.assertEqual(
+            [(node.name, node.slot) for node in nodes if node.name.startswith("mecn")],
+            [(node.name, node.slot) for node in db.nodes][:4]
+            + [("mecn0006", db.nodes["mecn0006"].slot)],
+        )
+        with self.assertRaisesRegex(RacksDBError, "Invalid nodeset mecn\\[0001"):
+            db.nodes.filter(name="mecn[0001")
+
+    def test_filter_lazy(self):
+        db = RacksDB.load(schema=self.schema_path, db=self.db_path)
+        view = db.nodes.filter(lazy=True, tags=["compute"])
+        self.assertIsInstance(view, DBFilterView)
+        nodes = db.nodes.filter(tags=["compute"])
+        self.assertEqual(len(view), len(nodes))
+        self.assertEqual(view.first(), nodes.first())
+        self.assertEqual(view[3], list(nodes)[3])
+        self.assertEqual(view[-1], list(nodes)[-1])
+        self.assertEqual(view[2:10:3], list(nodes)[2:10:3])
+        # Views are filtered again with additional criteria, the criteria are
+        # evaluated while values are consumed.
+        chained = view.filter(name="mecn[0001-0004,0200],mesrv0001")
+        self.assertEqual(
+            [node.name for node in chained],
+            ["mecn0001", "mecn0002", "mecn0003", "mecn0004", "mecn0200"],
+        )
+        selected = []
+        original = RacksDBNodeBase._select
+
+        def select(node, **kwargs):
+            selected.append(node)
+            return original(node, **kwargs)
+
+        with mock.patch.object(RacksDBNodeBase, "_select", select):
+            self.assertEqual(view.first().name, "mecn0001")
+        self.assertEqual(len(selected), 1)
+        self.assertFalse(db.nodes.filter(lazy=True, name="unknown"))
+        with self.assertRaises(IndexError):
+            db.nodes.filter(lazy=True, name="unknown").first()
+        # Views are materialized into collections of the type of their source.
+        materialized = chained.materialize()
+        self.assertIsInstance(materialized, DBDict)
+        self.assertEqual(
+            [str(key) for key in materialized.keys()], ["mecn[0001-0004]", "mecn0200"]
+        )
+        racks = db.racks.filter(lazy=True, name="R1-A01").materialize()
+        self.assertIsInstance(racks, DBList)
+        self.assertEqual([rack.name for rack in racks], ["R1-A01"])
+
+    def test_views_select(self):
+        db = RacksDB.load(schema=self.schema_path, db=self.db_path)
+        views = RacksDBViews()
+        for content, filters in [
+            ("datacenters", {"name": "paris", "tags": None}),
+            ("infrastructures", {"name": None, "tags": ["hpc"]}),
+            ("nodes", {"name": None, "infrastructure": "mercury", "tags": None}),
+            ("nodes", {"name": "mecn[0001-0004,0200]", "tags": ["compute"]}),
+            ("nodes", {"name": "mecn[0001-0100]", "tags": ["!compute"]}),
+            ("nodes", {"name": "unknown", "infrastructure": "mercury"}),
+            ("racks", {"name": "R1-A02"}),
+            ("racks", {"name": None}),
+        ]:
+            # Objects selected with indexes are the same as filtered objects, in
+            # the same order.
+            selected = views.select(db, views[content], filters)
+            self.assertIsInstance(selected, DBFilterView)
+            expected = getattr(db, content).filter(**filters)
+            self.assertEqual(
+                [(obj.name, getattr(obj, "slot", None)) for obj in selected],
+                [(obj.name, getattr(obj, "slot", None)) for obj in expected],
+            )
+            if isinstance(expected, DBDict):
+                self.assertEqual(
+                    [str(key) for key in selected.materialize().keys()],
+                    [str(key) for key in expected.keys()],
+                )
+        # Filters are evaluated only on the candidates of the most selective index.
+        selected = []
+        original = RacksDBNodeBase._select
+
+        def select(node, **kwargs):
+            selected.append(node)
+            return original(node, **kwargs)
+
+        with mock.patch.object(RacksDBNodeBase, "_select", select):
+            nodes = views.select(
+                db,
+                views["nodes"],
+                {"name": "mesrv0002", "infrastructure": "mercury", "tags": []},
+            )
+            self.assertEqual([node.name for node in nodes], ["mesrv0002"])
+        self.assertEqual([str(node.name) for node in selected], ["mesrv[0001-0004]"])
+
+    def test_snapshot_reload(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = Path(tmpdir).joinpath("cache")
+            db_path = Path(tmpdir).joinpath("db")
+            shutil.copytree(self.db_path, db_path)
+            db = RacksDB.load(schema=self.schema_path, db=db_path, cache=cache)
+            restored = RacksDB.load(schema=self.schema_path, db=db_path, cache=cache)
+            # Parsed contents of files are not saved in snapshot.
+            self.assertIsNone(restored._loader._content)
+            for loader in restored._loader.files.values():
+                self.assertNotIn("_content", vars(loader))
+            # Files are parsed again when DB content is requested.
+            self.assertEqual(restored._loader.content, db._loader.content)
+            # Restored DB is reloaded with the modified files.
+            restored = RacksDB.load(schema=self.schema_path, db=db_path, cache=cache)
+            db_file = db_path.joinpath("infrastructures", "mercury.yml")
+            db_file.write_text(
+                db_file.read_text().replace(
+                    "description: Mercury HPC cluster", "description: Mercury"
+                )
+            )
+            self.assertEqual(restored.reload(), {"infrastructures"})
+            self.assertEqual(restored.infrastructures["mercury"].description, "Mercury")
+            self.assertEqual(len(restored.nodes), len(db.nodes))
+
+    def test_load_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = Path(tmpdir).joinpath("cache")
+            db_path = Path(tmpdir).joinpath("db")
+            shutil.copytree(self.db_path, db_path)
+            # First load saves the snapshot
+            with self.assertLogs("racksdb.generic.snapshot", level="DEBUG") as cm:
+                db = RacksDB.load(schema=self.schema_path, db=db_path, cache=cache)
+            self.assertIn("Saved DB snapshot", cm.output[-1])
+            self.assertEqual(len(list(cache.iterdir())), 1)
+            # Second load restores DB from snapshot
+            with self.assertLogs("racksdb.generic.snapshot", level="DEBUG") as cm:
+                restored = RacksDB.load(
+                    schema=self.schema_path, db=db_path, cache=cache
+                )
+            self.assertIn("Loaded DB from snapshot", cm.output[-1])
+            self.assertEqual(type(restored), RacksDB)
+            self.assertEqual(len(restored.nodes), len(db.nodes))
+            self.assertEqual(len(restored.racks), len(db.racks))
+            self.assertEqual(
+                type(restored.nodes["mecn0001"]).__name__,
+                type(db.nodes["mecn0001"]).__name__,
+            )
+            self.assertEqual(
+                restored.nodes["mecn0001"].type.model, db.nodes["mecn0001"].type.model
+            )
+            # Modification of a database file makes the snapshot outdated
+            db_file = db_path.joinpath("infrastructures", "mercury.yml")
+            stat = db_file.stat()
+            os.utime(db_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            with self.assertLogs("racksdb.generic.snapshot", level="DEBUG") as cm:
+                RacksDB.load(schema=self.schema_path, db=db_path, cache=cache)
+            self.assertIn("is outdated", cm.output[0])
+            # Snapshot saved by another version of RacksDB code is outdated
+            with mock.patch(
+                "racksdb.generic.snapshot.code_digest", return_value="other"
+            ):
+                with self.assertLogs("racksdb.generic.snapshot", level="DEBUG") as cm:
+                    RacksDB.load(schema=self.schema_path, db=db_path, cache=cache)
+            self.assertIn("is outdated", cm.output[0])
@@ -12,7 +12,49 @@ from .generic.views import (
     DBAction,
     DBActionParameter,
     DBActionResponse,
+    candidates,
 )
+from .bases import _nodeset
+
+
+def _key_index(object_type, content, prop=None):
+    """Return function to select the objects of the given content with the key
+    index of the given type of objects, or with the index of the given property
+    when provided."""
+
+    def index(db, name):
+        obj = db.find_object(object_type, name, prop)
+        return candidates(db, getattr(db, content), [] if obj is None else [obj])
+
+    return index
+
+
+def _tags_index(content):
+    """Return function to select the objects of the given content with the inverted
+    index of tags."""
+
+    def index(db, tags):
+        return candidates(db, getattr(db, content), db.tags_index().objects(tags))
+
+    return index
+
+
+def _nodes_name_index(db, name):
+    """Select the nodes with the index of expanded keys of nodes, the expandable
+    nodes are selected when any of their names is in the nodeset."""
+    keys = {}
+    for _name in _nodeset(name):
+        try:
+            keys.setdefault(db.nodes.folded_key(_name))
+        except KeyError:
+            pass
+    return candidates(db, db.nodes, [db.nodes[key] for key in keys])
+
+
+def _nodes_infrastructure_index(db, infrastructure):
+    """Select the nodes with the nodes of the infrastructure."""
+    obj = db.find_object("Infrastructure", infrastructure)
+    return candidates(db, db.nodes, [] if obj is None else obj.nodes.values())
 
 
 class RacksDBViews(DBViewSet):
@@ -22,9 +64,16 @@ class RacksDBViews(DBViewSet):
             objects_name="Datacenter",
             description="Get information about datacenters",
             filters=[
-                DBViewFilter(name="name", description="Filter datacenters by name"),
                 DBViewFilter(
-                    name="tags", description="Filter datacenters by tag", nargs="*"
+                    name="name",
+                    description="Filter datacenters by name",
+                    index=_key_index("Datacenter", "datacenters"),
+                ),
+                DBViewFilter(
+                    name="tags",
+                    description="Filter datacenters by tag",
+                    nargs="*",
+                    index=_tags_index("datacenters"),
                 ),
             ],
             objects_map={
@@ -40,11 +89,16 @@ class RacksDBViews(DBViewSet):
             objects_name="Infrastructure",
             description="Get information about infrastructures",
             filters=[
-                DBViewFilter(name="name", description="Filter infrastructures by name"),
+                DBViewFilter(
+                    name="name",
+                    description="Filter infrastructures by name",
+                    index=_key_index("Infrastructure", "infrastructures"),
+                ),
                 DBViewFilter(
                     name="tags",
                     description="Filter infrastructures by tag",
                     nargs="*",
+                    index=_tags_index("infrastructures"),
                 ),
             ],
             objects_map={
@@ -59,12 +113,22 @@ class RacksDBViews(DBViewSet):
             objects_name="Node",
             description="Get information about nodes",
             filters=[
-                DBViewFilter(name="name", description="Filter nodes by name"),
+                DBViewFilter(
+                    name="name",
+                    description="Filter nodes by name",
+                    index=_nodes_name_index,
+                ),
                 DBViewFilter(
                     name="infrastructure",
                     description="Filter nodes by infrastructure",
+                    index=_nodes_infrastructure_index,
+                ),
+                DBViewFilter(
+                    name="tags",
+                    description="Filter nodes by tag",
+                    nargs="*",
+                    index=_tags_index("nodes"),
                 ),
-                DBViewFilter(name="tags", description="Filter nodes by tag", nargs="*"),
             ],
             objects_map={
                 "RacksDBGroupRack": "name",
@@ -79,7 +143,13 @@ class RacksDBViews(DBViewSet):
             content="racks",
             objects_name="Rack",
             description="Get information about racks",
-            filters=[DBViewFilter(name="name", description="Filter racks by name")],
+            filters=[
+                DBViewFilter(
+                    name="name",
+                    description="Filter racks by name",
+                    index=_key_index("Rack", "racks", "name"),
+                )
+            ],
             objects_map={
                 "RacksDBDatacenter": "name",
                 "RacksDBDatacenterRoom": "name",
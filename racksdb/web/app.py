@@ -17,6 +17,7 @@ from ..views import RacksDBViews
 from ..generic.openapi import OpenAPIGenerator
 from ..generic.dumpers import DBDumperFactory, SchemaDumperFactory
 from ..drawers import InfrastructureDrawer, RoomDrawer
+from ..errors import RacksDBError
 
 logger = logging.getLogger(__name__)
 
@@ -36,9 +37,19 @@ class RacksDBWebBlueprint(Blueprint):
         ext=RacksDB.DEFAULT_EXT,
         db=RacksDB.DEFAULT_DB,
         openapi=False,
+        cache=None,
+        workers=1,
+        expanded_cache=0,
     ):
         super().__init__("RacksDB web blueprint", __name__)
-        self.db = RacksDB.load(schema=schema, ext=ext, db=db)
+        self.db = RacksDB.load(
+            schema=schema,
+            ext=ext,
+            db=db,
+            cache=cache,
+            workers=workers,
+            expanded_cache=expanded_cache,
+        )
         self.views = RacksDBViews()
         self.add_url_rule("/schema", view_func=self._schema, methods=["GET"])
         self.add_url_rule("/dump", view_func=self._dump, methods=["GET"])
@@ -67,7 +78,6 @@ class RacksDBWebBlueprint(Blueprint):
         )
 
     def _dump_view(self, content):
-        data = getattr(self.db, content)
         view = self.views[content]
         filters = {}
         for _filter in view.filters:
@@ -75,10 +85,17 @@ class RacksDBWebBlueprint(Blueprint):
             if value is not None and _filter.nargs is not None:
                 value = value.split(",")
             filters[_filter.name] = value
-        data = data.filter(**filters)
-
-        if "list" in request.args:
-            data = [item.name for item in data]
+        try:
+            data = self.views.select(self.db, view, filters)
+
+            if "list" in request.args:
+                data = [item.name for item in data]
+            else:
+                data = data.materialize()
+        except RacksDBError as err:
+            # Invalid filters values, such as malformed nodeset expressions,
+            # are reported to clients as bad requests.
+            return Response(response=str(err), status=400, mimetype="text/plain")
 
         dump_format = request.args.get("format", "json")
         dumper = DBDumperFactory.get(dump_format)(
@@ -147,6 +164,28 @@ class RacksDBWebApp(Flask):
             default=RacksDB.DEFAULT_DB,
             type=Path,
         )
+        parser.add_argument(
+            "-c",
+            "--cache",
+            help="Directory of database snapshots cache, disabled when not set "
+            f"(ex: {RacksDB.DEFAULT_CACHE})",
+            type=Path,
+        )
+        parser.add_argument(
+            "-w",
+            "--workers",
+            help="Number of workers to parse database files in parallel "
+            "(default: %(default)s)",
+            default=1,
+            type=int,
+        )
+        parser.add_argument(
+            "--expanded-cache",
+            help="Maximum number of memoized expanded objects, 0 to disable "
+            "(default: %(default)s)",
+            default=0,
+            type=int,
+        )
         parser.add_argument(
             "--host",
             help="Binding interface for listening socket (default: %(default)s)",
@@ -173,7 +212,13 @@ class RacksDBWebApp(Flask):
         self.args = parser.parse_args()
         self.register_blueprint(
             RacksDBWebBlueprint(
-                self.args.schema, self.args.ext, self.args.db, self.args.openapi
+                self.args.schema,
+                self.args.ext,
+                self.args.db,
+                self.args.openapi,
+                self.args.cache,
+                self.args.workers,
+                self.args.expanded_cache,
             )
         )
 